@@ -0,0 +1,190 @@
+'''
+Time the label page on synthetic machines under the offscreen Qt platform:
+loading a machine with and without its cache, the first draw, every zoom
+step and every label click, plus the peak RSS. Each size runs in its own
+process so the peak RSS is its own, the JSON report holds one result per
+size and the commit it was measured on.
+
+    cd benchmarks
+    python bench_label.py --rows 10000 100000 1000000 --kpis 20 --out result.json
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+UI = os.path.join(HERE, '..', 'ui')
+sys.path.insert(0, UI)
+
+
+def stats(times):
+    '''
+    Summary in milliseconds of durations in seconds
+    '''
+    ms = np.array(times) * 1000
+    return {'n': len(ms), 'median': float(np.median(ms)), 'p95': float(np.percentile(ms, 95)),
+            'mean': float(ms.mean()), 'max': float(ms.max())}
+
+
+def commit():
+    '''
+    The commit of the working tree, with a -dirty suffix if it has changes
+    '''
+    try:
+        head = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=HERE, text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ('-dirty' if dirty else '')
+
+
+def run_case(case):
+    '''
+    Label one synthetic dataset, run in a fresh process
+    '''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from synthetic import generate
+    from matplotlib.backend_bases import MouseEvent
+    from PySide2.QtWidgets import QApplication
+
+    # the dataset is generated once and kept across runs, the cache is not
+    dir_ = 'r%d_k%d_%s_t%d_g%d' % (case['rows'], case['kpis'], case['file'], case['tag'], case['gaps'])
+    machines = generate(case['data_root'], dir_, 3, case['rows'], case['kpis'], case['file'], case['tag'],
+                        case['gaps'])
+    shutil.rmtree(os.path.join(case['data_root'], dir_, '.cache'), ignore_errors=True)
+    label_dir = tempfile.mkdtemp(prefix='bench_label_')
+    config = {'file': case['file'], 'tag': case['tag'], 'date': case['date'], 'noshow_kpi': None,
+              'data_root': case['data_root'], 'label_dir': label_dir, 'time_interval': '10s',
+              'decimate': True, 'cache_bytes': 1 << 30, 'prefetch': 2, 'mmap_cache': case['mmap_cache'],
+              'chunk_bytes': 256 << 20, 'renderer': case['renderer'], 'pyramid_rows': 1 << 18,
+              'trace': case['trace']}
+
+    # the label page loads its .ui file and images relative to ui/
+    os.chdir(UI)
+    app = QApplication.instance() or QApplication([])
+    from label_page import LabelWidget
+
+    def open_widget():
+        start = time.perf_counter()
+        widget = LabelWidget(config, dir_, machines)
+        widget.show()
+        while widget.labels is None:
+            app.processEvents()
+            time.sleep(0.001)
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        widget.canvas.draw()
+        return widget, loaded * 1000, (time.perf_counter() - start) * 1000
+
+    result = dict(case, dir=dir_)
+    widget, result['load_cold_ms'], result['first_draw_ms'] = open_widget()
+    canvas = widget.canvas
+    bbox = widget.kpi_plt.bbox
+    y = (bbox.y0 + bbox.y1) / 2
+
+    def send(name, x, draw, **kwargs):
+        start = time.perf_counter()
+        canvas.callbacks.process(name, MouseEvent(name, canvas, x, y, **kwargs))
+        if draw:
+            # the pending draw_idle of a new view
+            canvas.draw()
+        app.processEvents()
+        return time.perf_counter() - start
+
+    # zoom in towards the middle, then back out
+    x = (bbox.x0 + bbox.x1) / 2
+    steps = case['zoom_steps']
+    zoom = [send('scroll_event', x, True, button='up', step=1) for _ in range(steps)]
+    zoom += [send('scroll_event', x, True, button='down', step=-1) for _ in range(steps)]
+    result['zoom_ms'] = stats(zoom)
+
+    # right clicks across the axes, every second one closes a segment, the
+    # marks are blitted without a full draw
+    xs = np.linspace(bbox.x0 + 5, bbox.x1 - 5, case['clicks'])
+    result['label_ms'] = stats([send('button_press_event', x, False, button=3) for x in xs])
+    result['segments'] = len(widget.labels.segments)
+
+    # the next machine has been prefetched while the first one was labeled
+    start = time.perf_counter()
+    widget.jump(machines[1])
+    while widget.labels is None:
+        app.processEvents()
+        time.sleep(0.001)
+    canvas.draw()
+    result['switch_ms'] = (time.perf_counter() - start) * 1000
+    widget.close()
+
+    # reopen with the caches written by the first load
+    widget, result['load_warm_ms'], result['first_draw_warm_ms'] = open_widget()
+    widget.close()
+    shutil.rmtree(label_dir, ignore_errors=True)
+    # kilobytes on Linux
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='rows per machine, one result per size')
+    parser.add_argument('--kpis', type=int, default=20)
+    parser.add_argument('--file', choices=['csv', 'pkl', 'npz'], default='csv')
+    parser.add_argument('--no-tag', action='store_true')
+    parser.add_argument('--date', action='store_true', help='x-axis in time instead of row index')
+    parser.add_argument('--gaps', type=int, default=0, help='stretches of missing time per machine')
+    parser.add_argument('--renderer', choices=['collection', 'lines'], default='collection')
+    parser.add_argument('--no-mmap', action='store_true', help='parse the source on every load')
+    parser.add_argument('--zoom-steps', type=int, default=10)
+    parser.add_argument('--clicks', type=int, default=20)
+    parser.add_argument('--data-root', default=os.path.join(tempfile.gettempdir(), 'label_tool_bench'))
+    parser.add_argument('--out', help='write the report to this file instead of stdout')
+    parser.add_argument('--trace', help='also trace the spans of the label page to this json-lines file')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    import matplotlib
+    import PySide2
+    report = {'commit': commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'cpus': os.cpu_count(), 'numpy': np.__version__, 'matplotlib': matplotlib.__version__,
+              'pyside2': PySide2.__version__, 'results': []}
+    for rows in args.rows:
+        case = {'rows': rows, 'kpis': args.kpis, 'file': args.file, 'tag': not args.no_tag,
+                'date': args.date, 'gaps': args.gaps, 'renderer': args.renderer,
+                'mmap_cache': not args.no_mmap, 'zoom_steps': args.zoom_steps, 'clicks': args.clicks,
+                'data_root': args.data_root, 'trace': args.trace}
+        print('rows=%d ...' % rows, file=sys.stderr)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)],
+                                stdout=subprocess.PIPE, text=True, check=True).stdout
+        report['results'].append(json.loads(output.strip().splitlines()[-1]))
+
+    # every metric against rows, medians for the per-step ones
+    report['curves'] = {'rows': args.rows}
+    for key in ['load_cold_ms', 'load_warm_ms', 'first_draw_ms', 'zoom_ms', 'label_ms', 'switch_ms', 'peak_rss_mb']:
+        report['curves'][key] = [result[key]['median'] if isinstance(result[key], dict) else result[key]
+                                 for result in report['results']]
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
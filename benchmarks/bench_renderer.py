@@ -0,0 +1,68 @@
+'''
+Compare the redraw time of one Line2D per kpi against a single LineCollection.
+
+    cd benchmarks
+    python bench_renderer.py --rows 4000 --kpis 60
+'''
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ui'))
+from renderer import RENDERERS
+
+
+def bench(name, xs, ys, repeat):
+    canvas = FigureCanvasAgg(Figure(figsize=(11, 9)))
+    axes = canvas.figure.add_subplot(111)
+    axes.set_xlim(xs[0], xs[-1])
+    axes.set_ylim(-1, ys.shape[1])
+
+    start = time.perf_counter()
+    renderer = RENDERERS[name](axes)
+    renderer.set_data(xs, ys)
+    canvas.draw()
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        renderer.set_data(xs, ys + (i % 2) * 0.1)
+        canvas.draw()
+    redraw = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        renderer.remove()
+        renderer = RENDERERS[name](axes)
+        renderer.set_data(xs, ys)
+        canvas.draw()
+    rebuild = (time.perf_counter() - start) / repeat
+    return first, redraw, rebuild
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=4000, help='points per kpi, e.g. the decimated width')
+    parser.add_argument('--kpis', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    xs = np.arange(args.rows)
+    ys = rng.random((args.rows, args.kpis)) + np.arange(args.kpis)
+    print('rows=%d kpis=%d repeat=%d' % (args.rows, args.kpis, args.repeat))
+    print('%-12s %12s %12s %12s' % ('renderer', 'first (ms)', 'redraw (ms)', 'rebuild (ms)'))
+    for name in RENDERERS:
+        first, redraw, rebuild = bench(name, xs, ys, args.repeat)
+        print('%-12s %12.1f %12.1f %12.1f' % (name, first * 1000, redraw * 1000, rebuild * 1000))
+
+
+if __name__ == '__main__':
+    main()
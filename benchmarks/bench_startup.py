@@ -0,0 +1,109 @@
+'''
+Time the start of the tool under the offscreen Qt platform: from spawning
+the interpreter to the first painted configure window, then until the
+label window of a small synthetic dataset shows its first machine. Each
+run is a fresh process, the JSON report holds the median of the runs.
+
+    cd benchmarks
+    python bench_startup.py --repeat 5 --out startup.json
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+from bench_label import HERE, UI, commit
+
+# modules only needed once the label window opens
+HEAVY = ['matplotlib', 'pandas', 'pyarrow']
+
+
+def run_once(data_root):
+    '''
+    Open the configure window, then the label window, in this process
+    '''
+    spawned = float(os.environ['BENCH_SPAWNED'])
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    os.chdir(UI)
+    result = {}
+
+    start = time.perf_counter()
+    from PySide2.QtWidgets import QApplication
+    import config_page
+    result['import_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    app = QApplication([])
+    window = config_page.ConfigWidget()
+    window.show()
+    app.processEvents()
+    result['window_ms'] = (time.perf_counter() - start) * 1000
+    result['first_window_ms'] = (time.time() - spawned) * 1000
+    result['heavy_at_first_window'] = [name for name in HEAVY if name in sys.modules]
+
+    # fill in the form as a labeler would and start labeling
+    label_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    window.config['data_root'] = data_root
+    window.config['label_dir'] = label_dir
+    window.all_machine = window.read_dir()
+    window.choose_set('startup')
+    window.ui.fileType_comboBox.setCurrentText('csv')
+    window.ui.timeInterval_lineEdit.setText('10s')
+    window.ui.sequence_button.setChecked(True)
+    window.ui.display_button.setChecked(True)
+    start = time.perf_counter()
+    window.plot_figure()
+    while window.label_widget.labels is None:
+        app.processEvents()
+        time.sleep(0.001)
+    window.label_widget.canvas.draw()
+    result['label_window_ms'] = (time.perf_counter() - start) * 1000
+    window.label_widget.close()
+    shutil.rmtree(label_dir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=10000, help='rows of the machines of the label window')
+    parser.add_argument('--data-root', default=os.path.join(tempfile.gettempdir(), 'label_tool_bench'))
+    parser.add_argument('--out', help='write the report to this file instead of stdout')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_once(args.data_root)))
+        return
+
+    from synthetic import generate
+    generate(args.data_root, 'startup', 3, args.rows, 20)
+    runs = []
+    for _ in range(args.repeat):
+        env = dict(os.environ, BENCH_SPAWNED=repr(time.time()))
+        output = subprocess.run([sys.executable, os.path.join(HERE, 'bench_startup.py'), '--run',
+                                 '--data-root', args.data_root],
+                                stdout=subprocess.PIPE, text=True, check=True, env=env).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {'commit': commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'rows': args.rows,
+              'runs': runs}
+    for key in ['import_ms', 'window_ms', 'first_window_ms', 'label_window_ms']:
+        values = sorted(run[key] for run in runs)
+        report[key] = values[len(values) // 2]
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Write synthetic machines in the layout the configure page reads,
+<data_root>/<dir>/<machine>.<file type>, for the benchmarks.
+
+    cd benchmarks
+    python synthetic.py /tmp/bench_data --rows 100000 --kpis 20 --machines 3 --file csv
+'''
+import os
+import pickle
+import argparse
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ['csv', 'pkl', 'npz']
+
+
+def make_machine(rows, kpis, tag=True, interval=10, gaps=0, seed=0):
+    '''
+    Get a {'timestamp', 'value', 'tag'} dict of rows samples every interval
+    seconds: a daily cycle plus noise per kpi, a few level shifts
+    flagged in tag, and gaps missing stretches of time
+    '''
+    rng = np.random.default_rng(seed)
+    steps = np.full(rows, interval, dtype=np.int64)
+    if gaps and rows > 1:
+        steps[rng.choice(np.arange(1, rows), size=min(gaps, rows - 1), replace=False)] *= 100
+    steps[0] = 0
+    timestamp = 1600000000 + np.cumsum(steps)
+
+    phase = rng.random(kpis, dtype=np.float32) * 2 * np.pi
+    day = (timestamp % 86400 / 86400 * 2 * np.pi).astype(np.float32)
+    value = np.sin(day[:, None] + phase) + 0.1 * rng.standard_normal((rows, kpis), dtype=np.float32)
+    labels = np.zeros(rows, dtype=np.float32)
+    for start in rng.integers(0, rows, size=max(rows // 20000, 1)):
+        end = min(start + 50, rows)
+        value[start:end, rng.integers(0, kpis)] += 3
+        labels[start:end] = 1
+    return {'timestamp': timestamp, 'value': value.astype(np.float32), 'tag': labels if tag else None}
+
+
+def write_machine(path, data, file_):
+    if file_ == 'csv':
+        df = pd.DataFrame(data['value'], columns=['kpi%d' % i for i in range(data['value'].shape[1])])
+        df.insert(0, 'timestamp', data['timestamp'])
+        if data['tag'] is not None:
+            df['tag'] = data['tag']
+        df.to_csv(path, index=False, float_format='%.6g')
+    elif file_ == 'pkl':
+        with open(path, 'wb') as f:
+            pickle.dump({key: item for key, item in data.items() if item is not None}, f, protocol=4)
+    elif file_ == 'npz':
+        np.savez(path, **{key: item for key, item in data.items() if item is not None})
+    else:
+        raise ValueError('File type "' + file_ + '" is not supported!')
+
+
+def generate(data_root, dir_, machines, rows, kpis, file_='csv', tag=True, gaps=0, seed=0):
+    '''
+    Write machines m0, m1, ... of dir_ under data_root, files already
+    there are kept. Return the machine names.
+    '''
+    os.makedirs(os.path.join(data_root, dir_), exist_ok=True)
+    names = []
+    for i in range(machines):
+        machine = 'm%d' % i
+        path = os.path.join(data_root, dir_, machine + '.' + file_)
+        if not os.path.exists(path):
+            write_machine(path, make_machine(rows, kpis, tag, gaps=gaps, seed=seed + i), file_)
+        names.append(machine)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data_root')
+    parser.add_argument('--dir', default='synthetic')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--kpis', type=int, default=20)
+    parser.add_argument('--machines', type=int, default=3)
+    parser.add_argument('--file', choices=FORMATS, default='csv')
+    parser.add_argument('--no-tag', action='store_true')
+    parser.add_argument('--gaps', type=int, default=0, help='stretches of missing time')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    names = generate(args.data_root, args.dir, args.machines, args.rows, args.kpis, args.file,
+                     not args.no_tag, args.gaps, args.seed)
+    print('wrote', ', '.join(names), 'to', os.path.join(args.data_root, args.dir))
+
+
+if __name__ == '__main__':
+    main()
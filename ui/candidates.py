@@ -0,0 +1,208 @@
+'''
+Offline scoring of candidate anomalies, stored as intervals of rows in
+<sidecar>/candidates.json. The label page jumps from one candidate to the
+next to accept or reject it. Score a whole dataset on every core with
+
+    python candidates.py <data_root> <dir> <file type> [zscore|mad] [workers]
+'''
+import os
+import sys
+import json
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+
+from colcache import sidecar_dir, source_key
+from loader import data_path, read_data
+
+# rows of the trailing window of the rolling scores
+WINDOW = 60
+# rows of windows scored at a time
+BLOCK = 1 << 13
+# bumped when the scores change, stored candidates of other versions are scored again
+VERSION = 2
+# rows scoring above THRESHOLD are candidates
+THRESHOLD = {'zscore': 5.0, 'mad': 8.0}
+# candidates closer than GAP rows are joined
+GAP = 10
+
+
+def candidates_path(path):
+    return os.path.join(sidecar_dir(path), 'candidates.json')
+
+
+def windows(x, window=WINDOW, block=BLOCK):
+    '''
+    Yield (start, windows, values) for blocks of rows of x, row i of
+    windows holds the window values before values[i], NaN where the
+    series has not started yet. Blocks bound the copies of the windows
+    to a few megabytes.
+    '''
+    if not len(x):
+        return
+    padded = np.concatenate((np.full(window, np.nan), x))
+    view = sliding_window_view(padded[:-1], window)
+    for start in range(0, len(x), block):
+        yield start, view[start:start + block], x[start:start + block]
+
+
+def rolling_zscore(x, window=WINDOW):
+    '''
+    Distance of every value to the mean of the window rows before it, in
+    standard deviations of that window. The deviations are taken from the
+    mean of their own window, sums over the whole series would cancel for
+    kpis at a large level.
+    '''
+    score = np.zeros(len(x))
+    for start, block, values in windows(x, window):
+        valid = ~np.isnan(block)
+        count = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid, block, 0).sum(axis=1) / count
+            deviation = np.where(valid, block - mean[:, None], 0)
+            std = np.sqrt((deviation * deviation).sum(axis=1) / count)
+            rows = np.abs(values - mean) / np.maximum(std, 1e-6)
+        # the first rows have no history to compare against
+        rows[(count < max(window // 4, 2)) | np.isnan(values)] = 0
+        score[start:start + len(rows)] = rows
+    return np.minimum(score, 1e6)
+
+
+def _median(block):
+    '''
+    Median of every row of block ignoring NaN, and the count of values
+    '''
+    count = (~np.isnan(block)).sum(axis=1)
+    # NaN sort last
+    ordered = np.sort(block, axis=1)
+    index = np.arange(len(block))
+    lo = np.maximum((count - 1) // 2, 0)
+    return (ordered[index, lo] + ordered[index, count // 2 - (count == 0)]) / 2, count
+
+
+def mad_score(x, window=WINDOW):
+    '''
+    Distance of every value to the median of the window rows before it, in
+    median absolute deviations of that window
+    '''
+    score = np.zeros(len(x))
+    for start, block, values in windows(x, window):
+        median, count = _median(block)
+        mad = _median(np.abs(block - median[:, None]))[0] * 1.4826
+        with np.errstate(invalid='ignore'):
+            rows = np.abs(values - median) / np.maximum(mad, 1e-6)
+        rows[(count < max(window // 4, 2)) | np.isnan(values)] = 0
+        score[start:start + len(rows)] = np.nan_to_num(rows)
+    return np.minimum(score, 1e6)
+
+
+def score(value, method='zscore', window=WINDOW):
+    '''
+    Score of every row, the largest score of its kpis. Columns are scored
+    one at a time so a long machine never needs more than a few columns
+    of float64.
+    '''
+    rows = np.zeros(len(value))
+    for col in range(value.shape[1]):
+        x = np.asarray(value[:, col], dtype=np.float64)
+        np.maximum(rows, rolling_zscore(x, window) if method == 'zscore' else mad_score(x, window), out=rows)
+    return rows
+
+
+def intervals(scores, threshold, gap=GAP):
+    '''
+    Get [start, end, max score] of the runs of rows scoring above threshold,
+    runs less than gap rows apart are joined
+    '''
+    above = np.flatnonzero(scores > threshold)
+    if not len(above):
+        return []
+    breaks = np.flatnonzero(np.diff(above) > gap)
+    starts = above[np.concatenate(([0], breaks + 1))]
+    ends = above[np.append(breaks, len(above) - 1)]
+    peaks = np.maximum.reduceat(scores[above], np.concatenate(([0], breaks + 1)))
+    return [[int(s), int(e), float(p)] for s, e, p in zip(starts, ends, peaks)]
+
+
+def score_machine(config, dir_, machine, method='zscore', force=False):
+    '''
+    Score machine and store its candidates, return False when they were
+    up to date
+    '''
+    path = data_path(config, dir_, machine)
+    key = source_key(path)
+    key['method'] = method
+    key['version'] = VERSION
+    if not force:
+        try:
+            with open(candidates_path(path)) as f:
+                stored = json.load(f)
+            if all(stored.get(k) == v for k, v in key.items()):
+                return False
+        except (OSError, ValueError):
+            pass
+    data = read_data(config, dir_, machine)
+    result = dict(key, window=WINDOW, threshold=THRESHOLD[method],
+                  intervals=intervals(score(data['value'], method), THRESHOLD[method]))
+    os.makedirs(sidecar_dir(path), exist_ok=True)
+    tmp = candidates_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp, candidates_path(path))
+    return True
+
+
+def load_candidates(path):
+    '''
+    Get the (start, end) candidates of the source file path, none when
+    they were not scored or the file changed since
+    '''
+    try:
+        with open(candidates_path(path)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return []
+    key = source_key(path)
+    if stored.get('mtime') != key['mtime'] or stored.get('size') != key['size']:
+        return []
+    return [(start, end) for start, end, _ in stored['intervals']]
+
+
+def _score(args):
+    config, dir_, machine, method = args
+    try:
+        return machine, score_machine(config, dir_, machine, method), None
+    except Exception as e:
+        return machine, False, str(e)
+
+
+def score_all(config, dir_, machines, method='zscore', workers=None):
+    '''
+    Score machines on a pool of processes, yield (machine, scored, error)
+    as they finish
+    '''
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_score, [(config, dir_, machine, method) for machine in machines], chunksize=4):
+            yield result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [4, 5, 6]:
+        print('usage: python candidates.py <data_root> <dir> <file type> [zscore|mad] [workers]')
+        sys.exit(1)
+    data_root, dir_, file_ = sys.argv[1:4]
+    method = sys.argv[4] if len(sys.argv) > 4 else 'zscore'
+    if method not in THRESHOLD:
+        print('unknown method ' + method + ', use one of ' + ', '.join(THRESHOLD))
+        sys.exit(1)
+    workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    config = {'file': file_, 'data_root': data_root, 'noshow_kpi': None, 'tag': True, 'date': False,
+              'mmap_cache': True, 'chunk_bytes': 256 << 20, 'pyramid_rows': 1 << 18}
+    machines = sorted(f[:-len(file_)-1] for f in os.listdir(os.path.join(data_root, dir_))
+                      if not f.startswith('.') and f.endswith('.' + file_))
+    for machine, scored, error in score_all(config, dir_, machines, method, workers):
+        if error:
+            print(machine, 'failed:', error)
+        else:
+            print(machine, 'scored' if scored else 'up to date')
@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+
+# bump when the layout of the sidecar changes
+VERSION = 1
+
+
+def sidecar_dir(path):
+    '''
+    The sidecar of <root>/<dir>/<machine>.<file> lives in <root>/<dir>/.cache/,
+    which read_dir and check_config skip as a hidden entry
+    '''
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, '.cache', basename)
+
+
+def source_key(path):
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _save(dirname, name, array):
+    tmp = os.path.join(dirname, name + '.tmp.npy')
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(dirname, name + '.npy'))
+
+
+def write_sidecar(path, dict_):
+    '''
+    Convert a parsed machine dict to a float32 value matrix stored column by
+    column, an int64 timestamp array and a tag array, plus a small header
+    '''
+    dirname = sidecar_dir(path)
+    os.makedirs(dirname, exist_ok=True)
+    header = source_key(path)
+    header['version'] = VERSION
+    value = np.asfortranarray(np.asarray(dict_['value'], dtype=np.float32))
+    header['shape'] = list(value.shape)
+    _save(dirname, 'value', value)
+    for key in ['timestamp', 'tag']:
+        header[key] = dict_.get(key) is not None
+        if not header[key]:
+            continue
+        if key == 'timestamp':
+            array = np.asarray(dict_[key]).astype(np.int64)
+        else:
+            array = np.asarray(dict_[key])
+            if array.dtype == object:
+                array = array.astype(np.float32)
+        _save(dirname, key, array)
+    # the header is written last, a sidecar without it is never read
+    tmp = os.path.join(dirname, 'header.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp, os.path.join(dirname, 'header.json'))
+
+
+def load_sidecar(path):
+    '''
+    Memory-map the sidecar of path, return None if it is missing or stale
+    '''
+    dirname = sidecar_dir(path)
+    try:
+        with open(os.path.join(dirname, 'header.json')) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    key = source_key(path)
+    if header.get('version') != VERSION or header['mtime'] != key['mtime'] or header['size'] != key['size']:
+        return None
+    dict_ = {'timestamp': None, 'value': None, 'tag': None}
+    try:
+        dict_['value'] = np.load(os.path.join(dirname, 'value.npy'), mmap_mode='r')
+        for key in ['timestamp', 'tag']:
+            if header[key]:
+                dict_[key] = np.load(os.path.join(dirname, key + '.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return dict_
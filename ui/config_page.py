@@ -1,12 +1,12 @@
 import os
 
 from PySide2.QtWidgets import*
-from PySide2.QtGui import QPixmap, QIcon
-from PySide2.QtUiTools import QUiLoader
-from PySide2.QtCore import QFile, Slot
+from PySide2.QtCore import Slot
 
-from label_page import LabelWidget
+from item_list import ItemList
+from manifest import Manifest
 from msg_box import MsgBox
+from resources import load_ui, icon, pixmap
 
 
 class ConfigWidget(QWidget):
@@ -14,19 +14,20 @@ class ConfigWidget(QWidget):
     def __init__(self):
         self.config = {'file': None, 'tag': False, 'date': False,
                        'noshow_kpi': None, 'data_root': '../data',
-                       'label_dir': '../label', 'time_interval': None}
-        self.dir_button = None
+                       'label_dir': '../label', 'time_interval': None,
+                       'decimate': True, 'cache_bytes': 1 << 30, 'prefetch': 2,
+                       'mmap_cache': True, 'chunk_bytes': 256 << 20,
+                       'renderer': 'collection', 'pyramid_rows': 1 << 18,
+                       # a json-lines file to trace the timings of the label page to
+                       'trace': os.environ.get('LABEL_TOOL_TRACE')}
+        self.dir_ = None
         QWidget.__init__(self)
 
-        ui_file = QFile("configure_page.ui")
-        ui_file.open(QFile.ReadOnly)
-        loader = QUiLoader()
-        self.ui = loader.load(ui_file, self)
-        ui_file.close()
+        self.ui = load_ui('configure_page.ui', self)
         self.setFixedSize(1270, 800)
         self.setWindowTitle("Label Tool")
-        self.setWindowIcon(QIcon('images/logo.png'))
-        self.ui.data_label.setPixmap(QPixmap('images/data1.png'))
+        self.setWindowIcon(icon('images/logo.png'))
+        self.ui.data_label.setPixmap(pixmap('images/data1.png'))
         #self.ui.fileType_comboBox.setStyleSheet("QComboBox::drop-down {width: 30px;}")
         self.ui.fileType_comboBox.setStyleSheet("QComboBox {border:2px groove gray; border-radius:3px; }"
         "QComboBox::down-arrow {image: url(./images/arrow_black.png);}"
@@ -35,30 +36,20 @@ class ConfigWidget(QWidget):
         
         all_machine = self.read_dir()
         self.all_machine = all_machine
+        self.set_view = ItemList(sorted(all_machine), 'images/folder.png', 'images/folder_blue.png',
+                                 lambda set_: str(len(all_machine[set_])))
+        self.set_view.chosen.connect(self.choose_set)
         set_layout = QVBoxLayout()
-        set_layout.setSpacing(10)
-        button_list = [QPushButton(set_) for set_ in all_machine]
-        icon = QIcon(QPixmap('images/folder.png'))
-        for button in button_list:
-            button.setFixedSize(205, 40)
-            button.setIcon(icon)
-            button.setStyleSheet("QPushButton{font-family:'Calibri';font-size:20px;color:white;}")
-            button.clicked.connect(self.choose_set)
-            set_layout.addWidget(button)
-        set_layout.addStretch()
+        set_layout.setContentsMargins(10, 10, 10, 10)
+        set_layout.addWidget(self.set_view)
         self.ui.scrollAreaWidgetContents.setLayout(set_layout)
         self.ui.remove_lineEdit.setPlaceholderText('Please enter the KPIs to be removed separated by commas. e.g. 1,3,5')
         self.ui.start_button.clicked.connect(self.plot_figure)
 
-    @Slot()
-    def choose_set(self):
-        button = self.sender()
-        button.setIcon(QIcon(QPixmap('images/folder_blue.png')))
-        button.setStyleSheet("QPushButton{background-color:rgb(2,34,63);font-family:'Calibri';font-size:20px;color:rgb(24,144,255);}")        
-        if self.dir_button:
-            self.dir_button.setIcon(QIcon(QPixmap('images/folder.png')))
-            self.dir_button.setStyleSheet("QPushButton{font-family:'Calibri';font-size:20px;color:white;}")
-        self.dir_button = button
+    @Slot(str)
+    def choose_set(self, dir_):
+        self.set_view.set_current(dir_)
+        self.dir_ = dir_
 
     @Slot()
     def plot_figure(self):
@@ -69,20 +60,21 @@ class ConfigWidget(QWidget):
         noshow_kpi = self.ui.remove_lineEdit.text()
         if not self.check_config():
             return
-        dir_ = self.dir_button.text()
+        dir_ = self.dir_
         machine_list = self.all_machine[dir_]
+        # matplotlib and pandas are only imported once the label page opens
+        from label_page import LabelWidget
         self.label_widget = LabelWidget(self.config, dir_, machine_list)
         self.label_widget.show()
 
     def check_config(self):
-        if not self.dir_button:
+        if not self.dir_:
             self.msg_box = MsgBox('Please select the directory where the data you want to label is stored')
             self.msg_box.show()
             return False
-        dir_ = self.dir_button.text()
-        files = os.listdir(os.path.join(self.config['data_root'], dir_))
-        types = [f.split('.')[1] for f in files if not f.startswith('.')]
-        types = list(set(types))
+        dir_ = self.dir_
+        # only this directory needs its files checked again
+        types = self.manifest.refresh_dir(dir_).types(dir_)
         if len(types) != 1 or types[0] != self.config['file']:
             self.msg_box = MsgBox('The file type of data does not match the selected one')
             self.msg_box.show()
@@ -110,14 +102,9 @@ class ConfigWidget(QWidget):
         return True
 
     def read_dir(self):
-        all_machine = {}
-        root = self.config['data_root']
-        dir_list = os.listdir(root)
-        for dir_ in dir_list:
-            ip_files = os.listdir(os.path.join(root, dir_))
-            if ip_files:
-                all_machine[dir_] = [f.split('.')[0] for f in ip_files if not f.startswith('.')]
-        return all_machine
+        # only the directories changed since the last start are listed again
+        self.manifest = Manifest(self.config['data_root']).refresh()
+        return self.manifest.all_machine()
 
 if __name__ == '__main__':
     app = QApplication([])
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def visible_range(xs, x_min, x_max):
+    '''
+    Get the slice [lo, hi) of xs inside the x-limits, padded with one
+    sample on each side so the lines still run off the edges of the axes
+    '''
+    n = len(xs)
+    lo = max(int(np.searchsorted(xs, x_min, side='left')) - 1, 0)
+    hi = min(int(np.searchsorted(xs, x_max, side='right')) + 1, n)
+    return lo, hi
+
+
+def minmax_decimate(xs, ys, x_min, x_max, width):
+    '''
+    Reduce the samples inside [x_min, x_max] to the first, min, max and last
+    value of every horizontal pixel, so spikes stay visible at any zoom level.
+    xs is a sorted 1-D array, ys has shape (n,) or (n, kpi_num).
+    '''
+    lo, hi = visible_range(xs, x_min, x_max)
+    xs = xs[lo:hi]
+    ys = ys[lo:hi]
+    width = max(int(width), 1)
+    if len(xs) <= 4 * width:
+        return xs, ys
+
+    # bucket boundaries at pixel edges, empty pixels are dropped
+    edges = np.linspace(x_min, x_max, width + 1)[1:-1]
+    starts = np.unique(np.concatenate(([0], np.searchsorted(xs, edges))))
+    starts = starts[starts < len(xs)]
+    ends = np.append(starts[1:], len(xs)) - 1
+
+    first = ys[starts]
+    last = ys[ends]
+    low = np.fmin.reduceat(ys, starts, axis=0)
+    high = np.fmax.reduceat(ys, starts, axis=0)
+
+    dec_xs = np.stack((xs[starts], xs[starts], xs[ends], xs[ends]), axis=1).ravel()
+    dec_ys = np.stack((first, low, high, last), axis=1)
+    dec_ys = dec_ys.reshape((-1,) + ys.shape[1:])
+    return dec_xs, dec_ys
@@ -0,0 +1,171 @@
+'''
+Export the labels of a dataset as dense 0/1 masks aligned with the rows of
+each machine, written with its values as one compressed shard per machine,
+<out_dir>/<dir>/<machine>.npz or .parquet, plus <out_dir>/<dir>/index.jsonl.
+Export a whole dataset on every core with
+
+    python export.py <data_root> <dir> <file type> <label_dir> <out_dir> [npz|parquet] [workers]
+
+Labels are read from the journal of a machine, else from the click log of
+the old tool. Machines without either are not exported. Every shard holds
+the keys of the source and the labels it was written from, shards whose
+source and labels did not change since are kept.
+'''
+import os
+import sys
+import json
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from colcache import source_key
+from loader import data_path, parse_file
+from label_store import LabelStore
+from label_journal import journal_path, legacy_path, replay, replay_legacy
+
+FORMATS = ['npz', 'parquet']
+
+
+def shard_path(out_dir, dir_, machine, format_):
+    return os.path.join(out_dir, dir_, machine + '.' + format_)
+
+
+def label_log(config, dir_, machine):
+    '''
+    The journal of machine, else the click log of the old tool, None when
+    it was never labeled
+    '''
+    for path in [journal_path(config, dir_, machine), legacy_path(config, dir_, machine)]:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_labels(log, rows):
+    store = LabelStore(rows)
+    return replay_legacy(log, store) if log.endswith('.txt') else replay(log, store)
+
+
+def read_stamp(path, format_):
+    '''
+    Get the stamp stored in the shard path, None if there is none
+    '''
+    try:
+        if format_ == 'npz':
+            with np.load(path) as shard:
+                return json.loads(str(shard['stamp'])) if 'stamp' in shard.files else None
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(path).metadata or {}
+        return json.loads(metadata[b'stamp']) if b'stamp' in metadata else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_shard(path, data, mask, stamp, format_):
+    tmp = path + '.tmp'
+    value = np.asarray(data['value'], dtype=np.float32)
+    if format_ == 'npz':
+        arrays = {'value': value, 'label': mask, 'stamp': np.array(json.dumps(stamp))}
+        for key in ['timestamp', 'tag']:
+            if data.get(key) is not None:
+                arrays[key] = np.asarray(data[key])
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {}
+        if data.get('timestamp') is not None:
+            columns['timestamp'] = np.asarray(data['timestamp'], dtype=np.int64)
+        for i in range(value.shape[1]):
+            columns['kpi%d' % i] = value[:, i]
+        if data.get('tag') is not None:
+            columns['tag'] = np.asarray(data['tag'], dtype=np.float32)
+        columns['label'] = mask
+        table = pa.table(columns).replace_schema_metadata({'stamp': json.dumps(stamp)})
+        pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, path)
+
+
+def export_machine(config, dir_, machine, out_dir, format_='npz', force=False):
+    '''
+    Write the shard of machine, return its index entry, None when it was
+    never labeled
+    '''
+    source = data_path(config, dir_, machine)
+    log = label_log(config, dir_, machine)
+    if log is None:
+        return None
+    path = shard_path(out_dir, dir_, machine, format_)
+    key = {'source': source_key(source), 'labels': os.path.basename(log), 'labels_key': source_key(log)}
+    stamp = None if force or not os.path.exists(path) else read_stamp(path, format_)
+    if stamp is not None and all(stamp.get(k) == v for k, v in key.items()):
+        return dict(stamp['entry'], written=False)
+
+    # every column, the masks are aligned with the rows of the source
+    data = parse_file(config, source, False)
+    rows, kpis = data['value'].shape
+    labels = read_labels(log, rows)
+    entry = {'machine': machine, 'file': os.path.basename(path), 'rows': int(rows), 'kpis': int(kpis),
+             'anomaly_rows': labels.anomaly_length, 'segments': len(labels.segments),
+             'points': len(labels.points), 'labels': key['labels']}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_shard(path, data, labels.mask(), dict(key, entry=entry), format_)
+    return dict(entry, written=True)
+
+
+def _export(args):
+    config, dir_, machine, out_dir, format_ = args
+    try:
+        return machine, export_machine(config, dir_, machine, out_dir, format_), None
+    except Exception as e:
+        return machine, None, str(e)
+
+
+def export_all(config, dir_, machines, out_dir, format_='npz', workers=None):
+    '''
+    Export machines on a pool of processes, yield (machine, entry, error)
+    as they finish. Only a few machines per worker are queued at a time,
+    so the memory stays bounded however many machines there are.
+    '''
+    machines = iter(machines)
+    limit = (workers or os.cpu_count() or 1) * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while True:
+            for machine in machines:
+                running.add(pool.submit(_export, (config, dir_, machine, out_dir, format_)))
+                if len(running) >= limit:
+                    break
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [6, 7, 8]:
+        print('usage: python export.py <data_root> <dir> <file type> <label_dir> <out_dir> [npz|parquet] [workers]')
+        sys.exit(1)
+    data_root, dir_, file_, label_dir, out_dir = sys.argv[1:6]
+    format_ = sys.argv[6] if len(sys.argv) > 6 else 'npz'
+    if format_ not in FORMATS:
+        print('unknown format ' + format_ + ', use one of ' + ', '.join(FORMATS))
+        sys.exit(1)
+    workers = int(sys.argv[7]) if len(sys.argv) > 7 else None
+    config = {'file': file_, 'data_root': data_root, 'label_dir': label_dir, 'noshow_kpi': None,
+              'tag': True, 'date': True, 'chunk_bytes': 256 << 20}
+    machines = sorted(f[:-len(file_)-1] for f in os.listdir(os.path.join(data_root, dir_))
+                      if not f.startswith('.') and f.endswith('.' + file_))
+    os.makedirs(os.path.join(out_dir, dir_), exist_ok=True)
+    exported = 0
+    # the index is streamed, one line per machine as it finishes
+    with open(os.path.join(out_dir, dir_, 'index.jsonl'), 'w') as index:
+        for machine, entry, error in export_all(config, dir_, machines, out_dir, format_, workers):
+            if error:
+                print(machine, 'failed:', error)
+            elif entry is not None:
+                index.write(json.dumps(entry) + '\n')
+                exported += 1
+    print('exported %d of %d machines to %s' % (exported, len(machines), os.path.join(out_dir, dir_)))
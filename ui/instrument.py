@@ -0,0 +1,166 @@
+'''
+Opt-in timing of the hot paths. Stages are wrapped in named spans and
+events are counted:
+
+    with span('parse', file=path) as s:
+        ...
+        s.set(rows=rows)
+    count('redecimate')
+
+Until enable() is called span returns a shared no-op and count returns at
+once. Once enabled, every span is appended to a JSON-lines trace with the
+host and pid, to be collected from every workstation, and the latest
+durations are kept for the latency overlay of the label page.
+'''
+import os
+import json
+import time
+import atexit
+import socket
+import threading
+
+from collections import deque
+
+# durations kept per span for the overlay
+RECENT = 200
+# seconds between writes of the trace
+FLUSH_INTERVAL = 1.0
+
+_tracer = None
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        ms = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        self.tracer.record(self.name, ms, self.fields)
+        return False
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+class Tracer:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.recent = {}
+        self.counters = {}
+        self.lines = []
+        self.last_flush = time.time()
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.file = open(path, 'a')
+
+    def record(self, name, ms, fields):
+        record = {'time': time.time(), 'host': self.host, 'pid': self.pid,
+                  'thread': threading.current_thread().name, 'span': name, 'ms': round(ms, 3)}
+        record.update(fields)
+        with self.lock:
+            self.recent.setdefault(name, deque(maxlen=RECENT)).append(ms)
+            self.lines.append(json.dumps(record, default=str))
+            if time.time() - self.last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def count(self, name, n):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        '''
+        Get {span: (calls, last, median, p95)} in milliseconds over the
+        latest calls, and the counters
+        '''
+        with self.lock:
+            recent = {name: list(durations) for name, durations in self.recent.items()}
+            counters = dict(self.counters)
+        spans = {}
+        for name, durations in recent.items():
+            ordered = sorted(durations)
+            spans[name] = (len(durations), durations[-1], ordered[len(ordered) // 2],
+                           ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)])
+        return spans, counters
+
+    def _flush(self):
+        if self.counters:
+            self.lines.append(json.dumps({'time': time.time(), 'host': self.host, 'pid': self.pid,
+                                          'counters': self.counters}))
+        try:
+            for line in self.lines:
+                self.file.write(line + '\n')
+            self.file.flush()
+        except (OSError, ValueError) as e:
+            print('Failed to write trace \"'+self.path+'\": '+str(e))
+        self.lines = []
+        self.last_flush = time.time()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+
+def enable(path):
+    '''
+    Start tracing to the JSON-lines file path, a no-op if already enabled
+    '''
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+        atexit.register(disable)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **fields):
+    if _tracer is None:
+        return _NULL
+    return _Span(_tracer, name, fields)
+
+
+def count(name, n=1):
+    if _tracer is not None:
+        _tracer.count(name, n)
+
+
+def summary():
+    if _tracer is None:
+        return {}, {}
+    return _tracer.summary()
@@ -0,0 +1,181 @@
+from PySide2.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QTableView, QHeaderView,
+                               QAbstractItemView, QStyledItemDelegate)
+from PySide2.QtGui import QColor, QFont, QPen
+from PySide2.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect, Signal, Slot
+
+import resources
+
+# the badge text of a row, see ItemListModel.set_badge
+BadgeRole = Qt.UserRole + 1
+
+
+class ItemListModel(QAbstractListModel):
+    '''
+    Names shown in a list, narrowed by a filter. Badges are looked up by
+    badge(name) the first time a row is painted, so only visible rows
+    cost anything, tooltips by tooltip(name) when a row is hovered.
+    '''
+
+    def __init__(self, names, badge=None, tooltip=None, parent=None):
+        QAbstractListModel.__init__(self, parent)
+        self.names = list(names)
+        self.shown = self.names
+        self.badge = badge
+        self.tooltip = tooltip
+        self.badges = {}
+        self.current = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.shown)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.shown[index.row()]
+        if role == Qt.DisplayRole:
+            return name
+        if role == BadgeRole:
+            if name not in self.badges:
+                self.badges[name] = self.badge(name) if self.badge else None
+            return self.badges[name]
+        if role == Qt.UserRole:
+            return name == self.current
+        if role == Qt.ToolTipRole and self.tooltip:
+            return self.tooltip(name)
+        return None
+
+    def set_filter(self, text):
+        text = text.strip().lower()
+        self.beginResetModel()
+        self.shown = [name for name in self.names if text in name.lower()] if text else self.names
+        self.endResetModel()
+
+    def set_badge(self, name, badge):
+        self.badges[name] = badge
+        self._changed(name)
+
+    def set_current(self, name):
+        previous, self.current = self.current, name
+        self._changed(previous)
+        self._changed(name)
+
+    def index_of(self, name):
+        try:
+            return self.index(self.shown.index(name))
+        except ValueError:
+            return QModelIndex()
+
+    def _changed(self, name):
+        index = self.index_of(name)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+
+class ItemDelegate(QStyledItemDelegate):
+    '''
+    Paint a row like the buttons of the side bar: an icon, the name and a
+    badge on the right, highlighted when it is the current one
+    '''
+
+    def __init__(self, icon, icon_current, parent=None):
+        QStyledItemDelegate.__init__(self, parent)
+        self.pixmap = resources.pixmap(icon).scaled(16, 16, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.pixmap_current = resources.pixmap(icon_current).scaled(16, 16, Qt.KeepAspectRatio,
+                                                                    Qt.SmoothTransformation)
+        self.font = QFont('Calibri')
+        self.font.setPixelSize(20)
+        self.badge_font = QFont('Calibri')
+        self.badge_font.setPixelSize(13)
+
+    def sizeHint(self, option, index):
+        return QSize(205, 50)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(0, 5, 0, -5)
+        current = index.data(Qt.UserRole)
+        if current:
+            painter.fillRect(rect, QColor(2, 34, 63))
+        pixmap = self.pixmap_current if current else self.pixmap
+        painter.drawPixmap(rect.left() + 10, rect.center().y() - pixmap.height() // 2, pixmap)
+        text_rect = rect.adjusted(34, 0, -60, 0)
+        painter.setFont(self.font)
+        painter.setPen(QColor(24, 144, 255) if current else Qt.white)
+        metrics = painter.fontMetrics()
+        name = metrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideMiddle, text_rect.width())
+        painter.drawText(text_rect.left(), self._baseline(text_rect, metrics), name)
+        badge = index.data(BadgeRole)
+        if badge:
+            painter.setFont(self.badge_font)
+            metrics = painter.fontMetrics()
+            width = metrics.width(badge) + 12
+            badge_rect = QRect(rect.right() - width - 6, rect.center().y() - 9, width, 18)
+            painter.setPen(QPen(QColor(24, 144, 255)))
+            painter.drawRoundedRect(badge_rect, 9, 9)
+            painter.drawText(badge_rect.left() + 6, self._baseline(badge_rect, metrics), badge)
+        painter.restore()
+
+    @staticmethod
+    def _baseline(rect, metrics):
+        # vertically centred text
+        return rect.center().y() + (metrics.ascent() - metrics.descent()) // 2
+
+
+class ItemList(QWidget):
+    '''
+    Filterable list of machines or datasets for the side bar, emits chosen
+    with the name of a clicked row. Rows are painted on demand, so opening
+    a directory costs the same however many files it holds.
+    '''
+    chosen = Signal(str)
+
+    def __init__(self, names, icon, icon_current, badge=None, tooltip=None, parent=None):
+        QWidget.__init__(self, parent)
+        self.model = ItemListModel(names, badge, tooltip, self)
+        self.filter = QLineEdit()
+        self.filter.setPlaceholderText('Filter')
+        self.filter.setStyleSheet("QLineEdit{font-family:'Calibri';font-size:16px;color:white;"
+                                  "border:1px solid rgb(24,144,255);border-radius:3px;padding:2px;}")
+        self.filter.textChanged.connect(self._filter)
+        # a one column table with fixed row heights: unlike QListView it
+        # never lays out every row, only the visible ones are touched
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(ItemDelegate(icon, icon_current, self.view))
+        self.view.horizontalHeader().hide()
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(50)
+        self.view.setShowGrid(False)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.view.setFrameShape(QTableView.NoFrame)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.clicked.connect(self._clicked)
+        self.view.activated.connect(self._clicked)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.filter)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+    def set_current(self, name):
+        self.model.set_current(name)
+        index = self.model.index_of(name)
+        if index.isValid():
+            self.view.scrollTo(index)
+
+    def set_badge(self, name, badge):
+        self.model.set_badge(name, badge)
+
+    @Slot(str)
+    def _filter(self, text):
+        self.model.set_filter(text)
+        index = self.model.index_of(self.model.current)
+        if index.isValid():
+            self.view.scrollTo(index)
+
+    @Slot(QModelIndex)
+    def _clicked(self, index):
+        self.chosen.emit(index.data(Qt.DisplayRole))
@@ -0,0 +1,78 @@
+import os
+import json
+import warnings
+import numpy as np
+
+from colcache import sidecar_dir, source_key
+
+# per-kpi statistics of a profile, each a list aligned with profile['kpi']
+STATS = ['zeros', 'nans', 'min', 'max', 'mean', 'std', 'constant']
+
+
+def compute_profile(value, kpi):
+    '''
+    Zero counts, NaN counts, min/max, mean/std and a constant-column flag of
+    every kpi, computed in one vectorized pass over the value matrix
+    '''
+    value = np.asarray(value)
+    if value.dtype == object:
+        value = value.astype(np.float64)
+    with warnings.catch_warnings():
+        # all-NaN columns give NaN statistics
+        warnings.simplefilter('ignore', RuntimeWarning)
+        min_ = np.nanmin(value, axis=0)
+        max_ = np.nanmax(value, axis=0)
+        mean = np.nanmean(value, axis=0, dtype=np.float64)
+        std = np.nanstd(value, axis=0, dtype=np.float64)
+    nans = np.count_nonzero(np.isnan(value), axis=0)
+    return {'rows': int(value.shape[0]),
+            'kpi': [int(i) for i in kpi],
+            'zeros': np.count_nonzero(value == 0, axis=0).tolist(),
+            'nans': nans.tolist(),
+            'min': min_.astype(float).tolist(),
+            'max': max_.astype(float).tolist(),
+            'mean': mean.tolist(),
+            'std': std.tolist(),
+            'constant': ((min_ == max_) | (nans == value.shape[0])).tolist()}
+
+
+def select(profile, kpi):
+    '''
+    The statistics of profile for the kpis in kpi, in that order, as arrays
+    '''
+    index = [profile['kpi'].index(i) for i in kpi]
+    selected = {'rows': profile['rows'], 'kpi': np.array(kpi, dtype=np.int64)}
+    for stat in STATS:
+        selected[stat] = np.array(profile[stat])[index]
+    return selected
+
+
+def load_profile(path, value, kpi):
+    '''
+    Get the profile of the columns of value whose original indexes are kpi.
+    The profile is stored next to the source file and reused while the
+    source mtime and size are unchanged.
+    '''
+    profile_path = os.path.join(sidecar_dir(path), 'profile.json')
+    key = source_key(path)
+    stored = None
+    try:
+        with open(profile_path) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if stored is not None and stored['mtime'] == key['mtime'] and stored['size'] == key['size'] \
+            and set(kpi) <= set(stored['kpi']):
+        return select(stored, kpi)
+
+    profile = compute_profile(value, kpi)
+    profile.update(key)
+    try:
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        tmp = profile_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(profile, f)
+        os.replace(tmp, profile_path)
+    except OSError:
+        pass
+    return select(profile, kpi)
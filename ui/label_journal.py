@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import time
+import queue
+import threading
+
+# LabelStore methods a journal may replay
+OPS = ['add_point', 'undo_point', 'add_bound', 'add_segment', 'cancel_pending', 'undo_segment', 'reject']
+
+
+def journal_path(config, dir_, machine):
+    return config['label_dir']+'/'+dir_+'_'+machine+'_label_result.jsonl'
+
+
+def read_journal(path):
+    '''
+    Get the records of a journal, a line torn by a crash is skipped
+    '''
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('op') in OPS:
+                records.append(record)
+    return records
+
+
+def replay(path, store):
+    for record in read_journal(path):
+        getattr(store, record['op'])(*record.get('args', []))
+    return store
+
+
+def legacy_path(config, dir_, machine):
+    return config['label_dir']+'/'+dir_+'_'+machine+'_label_result.txt'
+
+
+# a line of the click logs written before the journal
+LEGACY_CLICK = re.compile(r'(single|double) click: button=(\d+), x=(-?[\d.]+)')
+
+
+def replay_legacy(path, store):
+    '''
+    Rebuild the labels of a click log of the old tool, whose lines are
+    'single click: button=3, x=120.000000'. The clicks are reconciled as
+    the label page reconciles them, see LabelStore.click_ops.
+    '''
+    with open(path) as f:
+        for line in f:
+            match = LEGACY_CLICK.match(line.strip())
+            if match is None:
+                continue
+            x = int(round(float(match.group(3))))
+            for op, args in store.click_ops(int(match.group(2)), x, match.group(1) == 'double'):
+                getattr(store, op)(*args)
+    return store
+
+
+def snapshot(store):
+    '''
+    The shortest list of records rebuilding the current labels of store
+    '''
+    records = [{'op': 'add_point', 'args': [x]} for x in store.points]
+    records += [{'op': 'add_segment', 'args': list(segment)} for segment in store.segments]
+    records += [{'op': 'reject', 'args': list(candidate)} for candidate in store.rejected]
+    if store.pending is not None:
+        records.append({'op': 'add_bound', 'args': [store.pending]})
+    return records
+
+
+class JournalWriter:
+    '''
+    Append journal records from a background thread. Records are written in
+    batches and fsynced at most every sync_interval seconds, so the GUI thread
+    never waits on the disk. A failed write is kept in error until taken.
+    '''
+
+    def __init__(self, sync_interval=1.0):
+        self.sync_interval = sync_interval
+        self.error = None
+        self.error_lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, path, op, *args):
+        self.queue.put(('append', path, {'op': op, 'args': list(args), 'time': time.time()}))
+
+    def compact(self, path, records):
+        '''
+        Replace the journal by records once every queued append is written
+        '''
+        self.queue.put(('compact', path, records))
+
+    def sync(self):
+        '''
+        Wait until every queued record is written
+        '''
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def take_error(self):
+        '''
+        Get the message of the first write failed since the last call, None
+        if every write succeeded
+        '''
+        with self.error_lock:
+            error, self.error = self.error, None
+        return error
+
+    def _failed(self, path, e):
+        with self.error_lock:
+            if self.error is None:
+                self.error = 'Failed to write label journal \"'+path+'\": '+str(e)
+
+    def _run(self):
+        files = {}
+        last_sync = time.time()
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.sync_interval)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    running = False
+                    continue
+                kind, path, payload = item
+                try:
+                    if kind == 'append':
+                        if path not in files:
+                            files[path] = open(path, 'a')
+                        files[path].write(json.dumps(payload) + '\n')
+                    else:
+                        if path in files:
+                            files.pop(path).close()
+                        self._rewrite(path, payload)
+                except OSError as e:
+                    self._failed(path, e)
+            # fsync in batches, and whenever the queue falls idle
+            sync = not batch or not running or time.time() - last_sync >= self.sync_interval
+            for path, f in list(files.items()):
+                try:
+                    f.flush()
+                    if sync:
+                        os.fsync(f.fileno())
+                        files.pop(path).close()
+                except OSError as e:
+                    self._failed(path, e)
+                    files.pop(path, None)
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+            if sync:
+                last_sync = time.time()
+            for _ in batch:
+                self.queue.task_done()
+
+    def _rewrite(self, path, records):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
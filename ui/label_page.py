@@ -1,33 +1,59 @@
 import os
 import math
 import time
-import pickle
-import pandas as pd
 import numpy as np
 
 from PySide2.QtWidgets import*
-from PySide2.QtGui import QPixmap, QIcon
-from PySide2.QtUiTools import QUiLoader
-from PySide2.QtCore import QFile, Slot
+from PySide2.QtGui import QKeySequence
+from PySide2.QtCore import Slot, Qt, QTimer
 
 import matplotlib as mpl
 import matplotlib.ticker as ticker
 from matplotlib.figure import Figure
-from matplotlib import pyplot as plt
 from matplotlib.backends.backend_qt5agg import (
         FigureCanvas, NavigationToolbar2QT as NavigationToolbar)
 
-from copy import deepcopy
+from decimate import minmax_decimate, visible_range
+from loader import MachineLoader, data_path, kpi_columns
+from renderer import RENDERERS, kpi_layout
+from overlay import MarkerOverlay
+from label_store import LabelStore
+from label_journal import JournalWriter, journal_path, replay, snapshot
+from load_thread import LoadThread
+from item_list import ItemList
+from thumbnail import thumbnail_path
+from candidates import load_candidates
+from label_progress import ProgressStore, STARTED, DONE
+import instrument
+from instrument import span, count
+from timeline import TimeFormatter, add_breaks, find_gaps, index_at, positions
+from msg_box import MsgBox
+from resources import load_ui, icon, pixmap
+
+# rows of the columns of a view gathered at a time
+OFFSET_BLOCK = 4096
 
 
 class CustomedToolbar(NavigationToolbar):
     # only display the buttons we need
     toolitems = [t for t in NavigationToolbar.toolitems if t[0] == 'Pan']
 
+class TracedCanvas(FigureCanvas):
+    '''
+    Canvas timing every full render, e.g. the one queued by draw_idle
+    '''
+
+    def draw(self):
+        with span('render') as s:
+            FigureCanvas.draw(self)
+            if instrument.enabled():
+                s.set(artists=sum(len(axes.get_children()) for axes in self.figure.axes))
+
+
 class PlotWidget(QWidget):
     def __init__(self, parent=None):
         QWidget.__init__(self, parent)
-        self.canvas = FigureCanvas(Figure(facecolor='white'))
+        self.canvas = TracedCanvas(Figure(facecolor='white'))
         #self.canvas.margins(0,0,0,0)
         vertical_layout = QVBoxLayout()
         vertical_layout.addWidget(self.canvas)
@@ -35,6 +61,33 @@ class PlotWidget(QWidget):
         self.setLayout(vertical_layout)
 
 
+class LatencyOverlay(QLabel):
+    '''
+    Latest span durations and counters drawn over the plot while tracing
+    '''
+
+    def __init__(self, parent, interval=500):
+        QLabel.__init__(self, parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet('background-color: rgba(0, 0, 0, 160); color: white; '
+                           'font-family: monospace; font-size: 11px; padding: 4px;')
+        self.move(330, 90)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(interval)
+
+    @Slot()
+    def refresh(self):
+        spans, counters = instrument.summary()
+        lines = ['%-16s %6s %8s %8s %8s' % ('span', 'calls', 'last', 'p50', 'p95')]
+        for name, (calls, last, median, p95) in sorted(spans.items()):
+            lines.append('%-16s %6d %8.1f %8.1f %8.1f' % (name, calls, last, median, p95))
+        if counters:
+            lines.append('  '.join('%s %d' % item for item in sorted(counters.items())))
+        self.setText('\n'.join(lines))
+        self.adjustSize()
+        self.raise_()
+
 
 class LabelWidget(QWidget):
 
@@ -48,92 +101,82 @@ class LabelWidget(QWidget):
         self.ind = 0
         self.tag_quantile = 0
         self.data = None
-        self.lr = -1
-        self.lr_list = []
-        self.x_list = []
-        self.segments = 0
-        self.anomaly_length = 0
-        self.lines = []
-        self.data_button = None
+        self.labels = None
+        # (start, end) rows scored by candidates.py and the one under review
+        self.candidates = []
+        self.candidate = None
+        self.series = []
+        self.xs = None
+        self.gaps = None
+        self.pyramid = None
+        self.layouts = {}
+        self.layout_kpis = {}
+        # the view each renderer was last computed for
+        self.views = {}
+        self.buffers = {}
         self.merge = False
-        ui_file = QFile('label_page.ui')
-        ui_file.open(QFile.ReadOnly)
-        loader = QUiLoader()
-        loader.registerCustomWidget(PlotWidget)
-        self.ui = loader.load(ui_file, self)
+        self.kpi_plt = None
+        self.load_thread = None
+        self.load_threads = []
+        self.loader = MachineLoader(config, dir_, config['cache_bytes'])
+        self.journal = JournalWriter()
+        self.progress = ProgressStore(config['label_dir'])
+        self.statuses = self.progress.statuses(dir_)
+        # the machine whose counts changed since they were last stored
+        self.unsaved = None
+        self.ui = load_ui('label_page.ui', self, [PlotWidget])
         self.setFixedSize(1450, 900)
-        self.ui.machine_label.setPixmap(QPixmap('images/machine1.png'))
-        ui_file.close()
+        self.ui.machine_label.setPixmap(pixmap('images/machine1.png'))
         self.setWindowTitle('Label Tool')
 
-        # add button to choose machine
+        # list to choose machine, rows are painted on demand
+        self.machine_view = ItemList(machine_list, 'images/line.png', 'images/line_blue.png', self._badge,
+                                     self._thumbnail)
+        self.machine_view.chosen.connect(self.jump)
         machine_layout = QVBoxLayout()
-        machine_layout.setSpacing(10)
-        button_list = [QPushButton(machine) for machine in machine_list]
-        for i, button in enumerate(button_list):
-            button.setFixedSize(205, 40)
-            if i == 0:
-                button.setIcon(QIcon(QPixmap('images/line_blue.png')))
-                button.setStyleSheet("QPushButton{background-color:rgb(2,34,63);font-family:'Calibri';font-size:20px;color:rgb(24,144,255);}")
-                self.data_button = button
-            else:
-                button.setIcon(QIcon(QPixmap('images/line.png')))
-                button.setStyleSheet("QPushButton{font-family:'Calibri';font-size:20px;color:white;}")
-            button.clicked.connect(self.jump)
-            machine_layout.addWidget(button)
-        machine_layout.addStretch()
+        machine_layout.setContentsMargins(10, 10, 10, 10)
+        machine_layout.addWidget(self.machine_view)
         self.ui.scrollAreaWidgetContents.setLayout(machine_layout)
 
-        # load the data of first machine
-        machine = self.machine_list[self.ind]
-        data = self._read_data(machine)
-        self.data = data
-        self.merge_kpi, self.merge_str = self.kpi_2be_merged(self.data)
-
-        # init figure and draw kpi time series of first machine
-        self.init_figure(data, self.merge)
+        # the figure is initialized once the first machine is loaded
         self.canvas = self.ui.plot_widget.canvas
         CustomedToolbar(self.canvas, self.ui.toolBar_widget)
-        self.draw(data, self.merge)
         self.canvas.mpl_connect('scroll_event', self._zoom)
         self.canvas.mpl_connect('button_press_event', self._zoom)
         self.canvas.mpl_connect('button_press_event', self._label)
 
         # set function button and add some information bars
         self.ui.timeInterval_button.setText(self.config['time_interval'])
-        self.ui.mergeKPIs_button.setText(self.merge_str+'To\n'+str(self.merge_kpi[-1]))
-        if self.config['date']:
-            start = time.localtime(data['timestamp'][0])
-            start = time.strftime("%Y/%m/%d\n%H:%M:%S", start)
-            end = time.localtime(data['timestamp'][len(data['timestamp'])-1])
-            end = time.strftime("%Y/%m/%d\n%H:%M:%S", end)
-        else:
-            start = '0'
-            end = str(data['value'].shape[0] - 1)
-        info = 'Start Index: ' + start + '  —  End Index: ' + end
-        self.ui.info_label.setText('| '+info)
-        self.ui.startIndex_button.setText(start)
-        self.ui.endIndex_button.setText(end)
         self.ui.finish_button.clicked.connect(self.finish)
         self.ui.merge_button.clicked.connect(self.merge_seperate)
-        self.setWindowIcon(QIcon('images/logo.png'))
+        self.ui.candidate_button.clicked.connect(self.next_candidate)
+        self.ui.accept_button.clicked.connect(self.accept_candidate)
+        self.ui.reject_button.clicked.connect(self.reject_candidate)
+        for key, slot in [('N', self.next_candidate), ('A', self.accept_candidate), ('R', self.reject_candidate)]:
+            QShortcut(QKeySequence(key), self, slot)
+        self.setWindowIcon(icon('images/logo.png'))
+
+        # timings of the hot paths, F2 toggles their overlay
+        self.latency = None
+        if config['trace']:
+            instrument.enable(config['trace'])
+            self.latency = LatencyOverlay(self)
+            QShortcut(QKeySequence('F2'), self, lambda: self.latency.setVisible(not self.latency.isVisible()))
+
+        # resume at the first unfinished machine, loaded in the background
+        self.ind = self._next_unfinished(0)
+        self._start_load(self.machine_list[self.ind])
 
     def kpi_2be_merged(self, data):
         '''
         Get the indexs of kpis need to be merged
         '''
-        value = data['value']
-        len_ = value.shape[0]
-        threshold = int(len_*0.99)
-        merge_kpi = []
+        profile = data['profile']
+        threshold = int(profile['rows']*0.99)
+        mergeable = profile['zeros'] >= threshold
         if self.config['noshow_kpi']:
-            for i in range(value.shape[1]):
-                if i not in self.config['noshow_kpi'] and np.sum(value[:, i] == 0) >= threshold:
-                    merge_kpi.append(i)
-        else:
-            for i in range(value.shape[1]):
-                if np.sum(value[:, i] == 0) >= threshold:
-                    merge_kpi.append(i)
+            mergeable &= ~np.isin(profile['kpi'], self.config['noshow_kpi'])
+        merge_kpi = [int(kpi) for kpi in profile['kpi'][mergeable]]
         merge_str = ""
         for i, kpi in enumerate(merge_kpi):
             if (i+1) % 6 == 0:
@@ -144,6 +187,13 @@ class LabelWidget(QWidget):
             merge_str += '\n'
         return merge_kpi, merge_str
 
+    def _merge_text(self):
+        if not self.merge_kpi:
+            return ''
+        if self.merge:
+            return str(self.merge_kpi[-1])+'\nTo\n'+self.merge_str
+        return self.merge_str+'To\n'+str(self.merge_kpi[-1])
+
 
     def init_figure(self, data, merge=False):
         figure = self.ui.plot_widget.canvas.figure
@@ -152,10 +202,10 @@ class LabelWidget(QWidget):
         # get the kpi list storing the indexes of kpis which need ploting
         kpi_num = data['value'].shape[1]
         if not config['noshow_kpi']:
-            kpi_list = list(range(kpi_num))
+            kpi_list = kpi_columns(data)
             self.kpi_num = kpi_num
         else:
-            kpi_list = [i for i in range(kpi_num) if i not in config['noshow_kpi']]
+            kpi_list = [i for i in kpi_columns(data) if i not in config['noshow_kpi']]
             self.kpi_num = len(kpi_list)
 
         # init subplot
@@ -182,72 +232,83 @@ class LabelWidget(QWidget):
         kpi_plt.tick_params(axis="y", labelsize=7)
         kpi_plt.set_yticks(range(0, len(kpi_list)))
         kpi_plt.grid(linestyle="-.", color='black', linewidth=0.05)
-        xs = list(range(data['value'].shape[0]))
         if config['date']:
-            def ts2dt(x, pos):
-                time_local = time.localtime(x)
-                dt = time.strftime("%Y/%m/%d %H:%M:%S", time_local)
-                return dt
-            formatter_x = ticker.FuncFormatter(ts2dt)
-            kpi_plt.xaxis.set_major_formatter(formatter_x)
-            xs = [int(date) for date in self.data['timestamp']]
-        space_x = int(len(xs) * 0.01 * (xs[1] - xs[0]))
-        kpi_plt.set_xlim(xs[0]-space_x, xs[-1]+space_x)
+            kpi_plt.xaxis.set_major_formatter(TimeFormatter())
+        # the tag axes share x, a change of either emits xlim_changed on kpi_plt
+        kpi_plt.callbacks.connect('xlim_changed', self._redecimate)
         self.kpi_plt = kpi_plt
 
+        # the artists drawing the traces are kept and updated by every draw
+        renderer = RENDERERS[config['renderer']]
+        self.kpi_renderers = {False: renderer(kpi_plt), True: renderer(kpi_plt)}
+        if config['tag']:
+            self.tag_renderer = renderer(tag_plt, colors=['blue'], linewidth=mpl.rcParams['lines.linewidth'])
+
+
+    def reset_xlim(self, data):
+        '''
+        Show the whole series of a newly loaded machine
+        '''
+        xs = positions(data, self.config['date'])
+        space_x = int((xs[-1] - xs[0]) * 0.01)
+        self.kpi_plt.set_xlim(xs[0]-space_x, xs[-1]+space_x)
 
     def draw(self, data, merge=False):
-        
-        # clear lines in the figure
-        if not merge:
-            for line in self.lines:
-                line.remove()
-        else:
-            for line in self.lines:
-                if type(line) == mpl.lines.Line2D:
-                    line.remove()
-        self.lines = []
+        with span('draw', rows=len(data['value'])) as s:
+            self._draw(data, merge)
+            if instrument.enabled():
+                s.set(artists=sum(len(axes.get_children()) for axes in self.canvas.figure.axes),
+                      value_bytes=data['value'].nbytes,
+                      buffer_bytes=sum(buffer.nbytes for buffer in self.buffers.values()))
+
+    def _draw(self, data, merge):
         config = self.config
-        kpi_num = data['value'].shape[1]
-        if config['noshow_kpi'] is None:
-            kpi_list = list(range(kpi_num))
-        else:
-            kpi_list = [i for i in range(kpi_num) if i not in config['noshow_kpi']]
-        if merge:
-            kpi_list = [i for i in kpi_list if i not in self.merge_kpi]
-
-        # plot kpis
-        # TODO: modify
-        # value = deepcopy(data['value'][:, kpi_list])
-        value = data['value'][:, kpi_list]
-        if config['tag']:
-            tag = data['tag']
-        if config['date']:
-            dates = data['timestamp']
-            xs = [int(date) for date in dates]
-        else:
-            xs = list(range(value.shape[0]))
-        for index in range(len(kpi_list)):
-            value[:, index] += index
-        lines = self.kpi_plt.plot(xs, value, linewidth=1)
-        self.lines.extend(lines)
-
-        # merge kpis
-        if merge:
-            kpi_list.append(self.merge_kpi[-1])
-            for kpi in self.merge_kpi:
-                # TODO: modify
-                merge_value = deepcopy(data['value'][:, kpi]).T
-                #merge_value = data['value'][:, kpi].T
-                merge_value += (len(kpi_list) - 1)
-                self.lines.extend(self.kpi_plt.plot(xs, merge_value, linewidth=1))
+        self.xs = positions(data, config['date'])
+        self.gaps = find_gaps(self.xs) if config['date'] else np.zeros(0, dtype=np.int64)
+        self.pyramid = data.get('pyramid')
+        # the layouts of this machine are built on first use, see _layout
+        self.layouts = {}
+        self.views = {}
+        self.series = [self._layout(data, merge)]
 
         # plot tag
         if config['tag']:
-            lines = self.tag_plt.plot(xs, tag, color='blue')
-            self.lines.extend(lines)
-
-        # configure figure
+            tag = np.asarray(data['tag']).reshape(-1, 1)
+            self.series.append((self.tag_renderer, 'tag', tag, np.zeros(1, dtype=np.int64), np.zeros(1)))
+            factors = sorted(self.pyramid.levels.get('tag', {})) if self.pyramid is not None else []
+            if factors:
+                low, high, _ = self.pyramid.levels['tag'][factors[-1]]
+            else:
+                low = high = tag
+            low, high = np.nanmin(low), np.nanmax(high)
+            margin = (high - low) * 0.05 or 0.05
+            self.tag_plt.set_ylim(low - margin, high + margin)
+        for series in self.series:
+            self._refresh(series)
+        self._show_layout(merge)
+
+    def _layout(self, data, merge):
+        '''
+        Get the series of the separate or the merged layout of the kpis,
+        built once per machine, its renderer keeps its artists alive
+        '''
+        if merge in self.layouts:
+            return self.layouts[merge]
+        merge_kpi = self.merge_kpi if merge else None
+        kpi_list, value_cols, offsets = kpi_layout(kpi_columns(data), self.config['noshow_kpi'], merge_kpi)
+        self.layout_kpis[merge] = kpi_list
+        # the columns are only read for the rows in view, see _view
+        self.layouts[merge] = (self.kpi_renderers[merge], 'value', data['value'], value_cols, offsets)
+        return self.layouts[merge]
+
+    def _show_layout(self, merge):
+        '''
+        Show one layout of the kpis: swap the visible artists, the y-limits
+        and the tick labels
+        '''
+        for key, renderer in self.kpi_renderers.items():
+            renderer.set_visible(key == merge)
+        kpi_list = self.layout_kpis[merge]
         self.kpi_plt.set_ylim(-1, len(kpi_list))
         self.kpi_plt.set_yticks(range(0, len(kpi_list)))
         def seq2index(y, pos):
@@ -259,176 +320,398 @@ class LabelWidget(QWidget):
         self.kpi_plt.yaxis.set_major_formatter(formatter_y)
         self.canvas.draw_idle()
 
-    def _read_data(self, machine):
-        config = self.config
-        path = config['data_root'] + '/'+self.dir_+'/'+machine+'.'+config['file']
-        if not os.path.exists(path):
-            raise SystemError('File in \"'+path+'\" does not exist!')
-        dict_ = {'timestamp': None, 'value': None, 'tag':None}
-        if config['file'] == 'csv':
-            df = pd.read_csv(path)
-            dict_ = {'timestamp': df['timestamp']}
-            num = len(df.columns)
-            if 'tag' in df.columns:
-                dict_['tag'] = df['tag']
-                dict_['value'] = df.values[:, 1:num-1]
-            else:
-                dict_['value'] = df.values[:, 1:num]
-        elif config['file'] == 'pkl':
-            with open(path, 'rb') as f:
-                dict_ = pickle.load(f)
-        elif config['file'] == 'npz':
-            data = np.load(path)
-            dict_ = {}
-            for key in data.files:
-                dict_[key] = data[key]
-
-        if config['tag'] is False:
-            dict_['tag'] = None
-        if config['date'] is False:
-            dict_['timestamp'] = None
-        return dict_
+    def _view(self, renderer, name, source, cols, offsets):
+        '''
+        Get the points of the columns cols of source to draw for the current
+        x-limits, read from the coarsest pyramid level that still gives a
+        bucket per pixel, else decimated from the visible raw rows
+        '''
+        if not self.config['decimate']:
+            ys = self._offset(renderer, source, cols, offsets)
+            return add_breaks(self.xs, ys, self.xs, self.gaps)
+        x_min, x_max = self.kpi_plt.get_xlim()
+        width = self.kpi_plt.bbox.width
+        lo, hi = visible_range(self.xs, x_min, x_max)
+        pyramid = self.pyramid
+        factor = pyramid.level_for(name, hi - lo, width) if pyramid is not None else None
+        if factor is None:
+            ys = self._offset(renderer, source[lo:hi], cols, offsets)
+            xs, ys = minmax_decimate(self.xs[lo:hi], ys, x_min, x_max, width)
+            return add_breaks(xs, ys, self.xs, self.gaps)
+        starts, ends, low, high = pyramid.window(name, factor, lo, hi, cols)
+        xs = np.stack([self.xs[starts], self.xs[ends]], axis=1).ravel()
+        ys = self._buffer(renderer, 2 * len(starts), len(cols))
+        ys[0::2] = low
+        ys[1::2] = high
+        ys += offsets
+        return add_breaks(xs, ys, self.xs, self.gaps)
+
+    def _offset(self, renderer, rows, cols, offsets):
+        '''
+        Gather the columns cols of rows into the buffer of renderer and
+        shift each one by its offset in place. np.take with out buffers a
+        temporary copy of its result, so it is taken in blocks of rows.
+        '''
+        ys = self._buffer(renderer, len(rows), len(cols))
+        for lo in range(0, len(rows), OFFSET_BLOCK):
+            block = ys[lo:lo + OFFSET_BLOCK]
+            np.take(rows[lo:lo + OFFSET_BLOCK], cols, axis=1, out=block)
+            block += offsets
+        return ys
+
+    def _buffer(self, renderer, rows, cols):
+        '''
+        A float32 (rows, cols) array reused by every redraw of renderer,
+        only reallocated when it is too small. It is overwritten by the
+        next view, which always goes to the same renderer.
+        '''
+        buffer = self.buffers.get(renderer)
+        if buffer is None or buffer.shape[1] != cols or len(buffer) < rows:
+            buffer = np.empty((max(rows, 1024), cols), dtype=np.float32)
+            self.buffers[renderer] = buffer
+        return buffer[:rows]
+
+    def _redecimate(self, axes):
+        '''
+        Recompute the decimated lines when zooming or panning changes the view
+        '''
+        if not self.config['decimate'] or self.xs is None:
+            return
+        count('redecimate')
+        for series in self.series:
+            self._refresh(series)
+
+    def _refresh(self, series):
+        with span('view', series=series[1]) as s:
+            xs, ys = self._view(*series)
+            series[0].set_data(xs, ys)
+            s.set(points=len(xs))
+        self.views[series[0]] = self.kpi_plt.get_xlim(), self.kpi_plt.bbox.width
+
+    def _start_load(self, machine):
+        '''
+        Load machine on a worker thread, a load still running is cancelled
+        '''
+        if self.load_thread is not None:
+            self.load_thread.cancel.set()
+        self._flush_progress()
+        self.machine_view.set_current(machine)
+        self.labels = None
+        self.candidates = []
+        self.candidate = None
+        self.merge = False
+        if self.kpi_plt is not None:
+            # the marks of the previous machine, painted over the preview otherwise
+            self.overlay.set_data((), ())
+        self.ui.info_label.setText('| Loading ' + machine + ' ...')
+        thread = LoadThread(self.loader, machine, self._read_labels)
+        thread.progress.connect(self._load_progress)
+        thread.preview.connect(self._load_preview)
+        thread.loaded.connect(self._load_finished)
+        thread.failed.connect(self._load_failed)
+        thread.finished.connect(self._thread_finished)
+        # keep a reference until the thread has returned
+        self.load_threads.append(thread)
+        self.load_thread = thread
+        thread.start()
+
+    @Slot(float)
+    def _load_progress(self, fraction):
+        if self.sender() is self.load_thread:
+            self.ui.info_label.setText('| Loading %s ... %d%%' % (self.load_thread.machine, fraction * 100))
+
+    @Slot(object)
+    def _load_preview(self, data):
+        if self.sender() is self.load_thread:
+            self._show(data)
+
+    @Slot(object, object)
+    def _load_finished(self, data, labels):
+        thread = self.sender()
+        if thread is not self.load_thread:
+            return
+        self.load_thread = None
+        machine = thread.machine
+        self.data = data
+        self.labels = labels
+        self.candidates = load_candidates(data_path(self.config, self.dir_, machine))
+        with span('kpi_2be_merged'):
+            self.merge_kpi, self.merge_str = self.kpi_2be_merged(self.data)
+        self.ui.merge_label.setText('Merge KPIs')
+        self.ui.mergeKPIs_button.setText(self._merge_text())
+        self.ui.merge_button.setText('Merge')
+        self._show(data)
+        self._update_labels()
+        self._show_info(data)
+
+        # parse the next machines in the background while this one is labeled
+        ind = self.machine_list.index(machine)
+        num = len(self.machine_list)
+        self.loader.prefetch([self.machine_list[(ind+i) % num] for i in range(1, min(self.config['prefetch'], num-1)+1)])
+
+    @Slot(str)
+    def _load_failed(self, msg):
+        if self.sender() is self.load_thread:
+            self.load_thread = None
+            self.ui.info_label.setText('| ' + msg)
+            self.msg_box = MsgBox(msg)
+            self.msg_box.show()
+
+    @Slot()
+    def _thread_finished(self):
+        self.load_threads.remove(self.sender())
+
+    def _show(self, data):
+        '''
+        Draw a machine, a coarse preview or the full data
+        '''
+        if self.kpi_plt is None:
+            self.init_figure(data, self.merge)
+            self.overlay = MarkerOverlay(self.canvas, [self.kpi_plt, self.tag_plt] if self.config['tag'] else [self.kpi_plt])
+        self.reset_xlim(data)
+        self.draw(data, self.merge)
+
+    def _show_info(self, data):
+        if self.config['date']:
+            start = time.localtime(data['timestamp'][0])
+            start = time.strftime("%Y/%m/%d\n%H:%M:%S", start)
+            end = time.localtime(data['timestamp'][len(data['timestamp'])-1])
+            end = time.strftime("%Y/%m/%d\n%H:%M:%S", end)
+        else:
+            start = '0'
+            end = str(data['value'].shape[0] - 1)
+        info = 'Start Index: ' + start + '  —  End Index: ' + end
+        self.ui.info_label.setText('| '+info)
+        self.ui.startIndex_button.setText(start)
+        self.ui.endIndex_button.setText(end)
 
     def _zoom(self, event):
         axtemp = event.inaxes
+        if axtemp is None:
+            return
         x_min, x_max = axtemp.get_xlim()
         scale = (x_max - x_min) / 10
         if event.button == 'up':
-            axtemp.set(xlim=(x_min + scale, x_max - scale))
+            with span('zoom'):
+                axtemp.set(xlim=(x_min + scale, x_max - scale))
+            self.canvas.draw_idle()
         elif event.button == 'down':
-            axtemp.set(xlim=(x_min - scale, x_max + scale))
-        self.canvas.draw_idle()
+            with span('zoom'):
+                axtemp.set(xlim=(x_min - scale, x_max + scale))
+            self.canvas.draw_idle()
 
     def _label(self, event):
         machine = self.machine_list[self.ind]
         axtemp = event.inaxes
-        if axtemp.get_title() not in ['kpi', 'tag']:
+        if axtemp is None or axtemp.get_title() not in ['kpi', 'tag']:
             return
-        path = self.config['label_dir']+'/'+self.dir_+'_'+machine+'_label_result.txt'
-        if self.config['date']:
-            x_data = (event.xdata - self.data['timestamp'][0]) / (self.data['timestamp'][1] - self.data['timestamp'][0])
+        if self.labels is None or event.button not in [2, 3]:
+            # still loading, or not a label button
+            return
+        with span('label', button=event.button) as s:
+            self._label_at(machine, event, index_at(self.xs, event.xdata))
+            s.set(marks=len(self.labels.marks()))
+
+    def _label_at(self, machine, event, x_data):
+        for op, args in self.labels.click_ops(event.button, x_data, event.dblclick):
+            self._record(machine, op, *args)
+        self._update_labels()
+
+    def _record(self, machine, op, *args):
+        '''
+        Apply a label operation and append it to the journal of machine
+        '''
+        getattr(self.labels, op)(*args)
+        self.journal.append(journal_path(self.config, self.dir_, machine), op, *args)
+        # the counts are stored when the status changes or the machine is left
+        if machine not in self.statuses:
+            self._save_progress(machine, STARTED)
         else:
-            x_data = event.xdata
-        x_data = math.ceil(x_data)
-
-        with open(path, 'a') as f:
-            f.writelines('%s click: button=%d, x=%f \n' %
-                            ('double' if event.dblclick else 'single', event.button, x_data))
-            if event.button == 2:
-                if event.dblclick:
-                    if len(self.x_list) > 1:
-                        self.x_list.pop()
-                        self.x_list.pop()
-                        self.anomaly_length -= 1
-                        percent = ('%.2f%%' % (self.anomaly_length/self.data['value'].shape[0]*100))
-                        self.ui.percent_button.setText(str(percent))
-                        self.draw(self.data, self.merge)
-                elif not event.dblclick:
-                    self.x_list.append(x_data)
-                    self.anomaly_length += 1
-                    percent = ('%.2f%%' % (self.anomaly_length/self.data['value'].shape[0]*100))
-                    self.ui.percent_button.setText(str(percent))
-            elif event.button == 3:
-                if event.dblclick and self.lr > 0:
-                    if len(self.lr_list) > 2:
-                        self.lr_list.pop()
-                        right = self.lr_list.pop()
-                        left = self.lr_list.pop()
-                        self.segments -= 1
-                        self.anomaly_length -= (right - left + 1)
-                        percent = ('%.2f%%' % (self.anomaly_length/self.data['value'].shape[0]*100))
-                        self.ui.segment_button.setText(str(self.segments))
-                        self.ui.percent_button.setText(str(percent))
-                        self.lr *= -1
-                        self.draw(self.data, self.merge)
-                elif not event.dblclick:
-                    self.lr_list.append(x_data)
-                    self.lr *= -1
-                    if self.lr == -1:
-                        self.segments += 1
-                        self.anomaly_length += (self.lr_list[-1] - self.lr_list[-2] + 1)
-                        percent = ('%.2f%%' % (self.anomaly_length/self.data['value'].shape[0]*100))
-                        self.ui.segment_button.setText(str(self.segments))
-                        self.ui.percent_button.setText(str(percent))
-            axtemp = event.inaxes
-            if not self.config['date']:
-                self.lines.append(axtemp.vlines(self.x_list, ymin=[0 for _ in range(len(self.x_list))], 
-                    ymax=[self.kpi_num for _ in range(len(self.x_list))], colors='r',linestyles='-',linewidth=1))
-                self.lines.append(axtemp.vlines(self.lr_list, ymin=[0 for _ in range(len(self.lr_list))], 
-                    ymax=[self.kpi_num for _ in range(len(self.lr_list))], colors='r', linestyles='-', linewidth=1))
-            else:
-                new_x = [self.data['timestamp'][0] + x*(self.data['timestamp'][1] - self.data['timestamp'][0]) for x in self.x_list]
-                new_lr = [self.data['timestamp'][0] + lr*(self.data['timestamp'][1] - self.data['timestamp'][0]) for lr in self.lr_list]
-                self.lines.append(axtemp.vlines(new_x, ymin=[0 for _ in range(len(new_x))], 
-                    ymax=[self.kpi_num for _ in range(len(new_x))], colors='r',linestyles='-',linewidth=1))
-                self.lines.append(axtemp.vlines(new_lr, ymin=[0 for _ in range(len(new_lr))], 
-                    ymax=[self.kpi_num for _ in range(len(new_lr))], colors='r', linestyles='-', linewidth=1))
+            self.unsaved = machine
+        self._check_journal()
 
-    @Slot()
-    def jump(self):
-        button = self.sender()
-        button.setIcon(QIcon(QPixmap('images/line_blue.png')))
-        button.setStyleSheet("QPushButton{background-color:rgb(2,34,63);font-family:'Calibri';font-size:20px;color:rgb(24,144,255);}")
-        if self.data_button:
-            self.data_button.setIcon(QIcon(QPixmap('images/line.png')))
-            self.data_button.setStyleSheet("QPushButton{font-family:'Calibri';font-size:20px;color:white;}")
-        self.data_button = button
-        machine = button.text()
+    def _check_journal(self):
+        '''
+        Show a failed write of the journal writer, the labels since are only
+        kept in memory
+        '''
+        error = self.journal.take_error()
+        if error is not None:
+            self.ui.info_label.setText('| ' + error)
+            self.msg_box = MsgBox(error)
+            self.msg_box.show()
+
+    def _read_labels(self, machine, data):
+        '''
+        Rebuild the labels of machine from its journal, called on the load
+        thread so waiting for the queued records never blocks the GUI
+        '''
+        self.journal.sync()
+        store = LabelStore(data['value'].shape[0])
+        return replay(journal_path(self.config, self.dir_, machine), store)
+
+    def _update_labels(self):
+        '''
+        Refresh the segment and percent bars and repaint the label marks
+        '''
+        self.ui.segment_button.setText(str(len(self.labels.segments)))
+        self.ui.percent_button.setText('%.2f%%' % self.labels.percent)
+        self._update_overlay()
+
+    def _update_overlay(self):
+        '''
+        Repaint the label marks, completed left/right pairs are shaded
+        '''
+        last = len(self.xs) - 1
+        marks = self.xs[np.clip(np.array(self.labels.marks(), dtype=np.int64), 0, last)]
+        spans = self.xs[np.clip(np.array(self.labels.segments, dtype=np.int64).reshape(-1, 2), 0, last)]
+        candidate = () if self.candidate is None else self.xs[np.clip(self.candidates[self.candidate], 0, last)]
+        self.overlay.set_data(marks, spans, candidate)
+        self.overlay.update()
+
+    def closeEvent(self, event):
+        for thread in self.load_threads:
+            thread.cancel.set()
+            thread.wait()
+        self._flush_progress()
+        self.loader.close()
+        self.journal.close()
+        self.progress.close()
+        instrument.disable()
+        QWidget.closeEvent(self, event)
+
+    @Slot(str)
+    def jump(self, machine):
         self.ind = self.machine_list.index(machine)
-        self.lr = -1
-        self.lr_list = []
-        self.x_list = []
-        self.segments = 0
-        self.anomaly_length = 0       
-        self.data = self._read_data(machine)
-        self.merge_kpi, self.merge_str = self.kpi_2be_merged(self.data)
-        self.ui.merge_label.setText('Merge KPIs')
-        self.ui.mergeKPIs_button.setText(self.merge_str+'To\n'+str(self.merge_kpi[-1]))
-        self.ui.merge_button.setText('Merge')
-        self.merge = False
-        self.draw(self.data, self.merge)
-        self.ui.segment_button.setText('0')
-        self.ui.percent_button.setText('0.0%')
+        self._start_load(machine)
+
+    def _badge(self, machine):
+        '''
+        Label progress of machine shown in the machine list
+        '''
+        return self.statuses.get(machine)
+
+    def _thumbnail(self, machine):
+        '''
+        The overview of machine rendered by thumbnail.py, shown as tooltip
+        '''
+        path = thumbnail_path(data_path(self.config, self.dir_, machine))
+        if os.path.exists(path):
+            return '<img src="%s">' % path
+        return None
+
+    def _save_progress(self, machine, status):
+        labels = self.labels
+        if labels is None:
+            self.progress.update(self.dir_, machine, status)
+        else:
+            self.progress.update(self.dir_, machine, status, len(labels.segments), labels.anomaly_length)
+            self.unsaved = None
+        if self.statuses.get(machine) != status:
+            self.statuses[machine] = status
+            self.machine_view.set_badge(machine, status)
+
+    def _flush_progress(self):
+        '''
+        Store the counts of the machine being left
+        '''
+        if self.unsaved is not None and self.labels is not None:
+            self._save_progress(self.unsaved, self.statuses[self.unsaved])
+
+    def _next_unfinished(self, start):
+        '''
+        Index of the first machine from start on, wrapping around, which is
+        not finished yet
+        '''
+        num = len(self.machine_list)
+        for i in range(num):
+            ind = (start + i) % num
+            if self.statuses.get(self.machine_list[ind]) != DONE:
+                return ind
+        return start % num
 
     @Slot()
     def merge_seperate(self):
+        if self.labels is None or not self.merge_kpi:
+            # still loading, or nothing to merge
+            return
         button = self.sender()
         if button.text() == 'Merge':
             button.setText('Seperate')
             self.merge = True
             self.ui.merge_label.setText('Seperate KPIs')
-            self.ui.mergeKPIs_button.setText(str(self.merge_kpi[-1])+'\nTo\n'+self.merge_str)
-            self.draw(self.data, self.merge)
-
         else:
             button.setText('Merge')
             self.merge = False
             self.ui.merge_label.setText('Merge KPIs')
-            self.ui.mergeKPIs_button.setText(self.merge_str+'To\n'+str(self.merge_kpi[-1]))
-            self.draw(self.data, self.merge)
+        self.ui.mergeKPIs_button.setText(self._merge_text())
+
+        # reuse the other layout, only refreshed if the view moved since it was drawn
+        series = self._layout(self.data, self.merge)
+        self.series[0] = series
+        if self.views.get(series[0]) != (self.kpi_plt.get_xlim(), self.kpi_plt.bbox.width):
+            self._refresh(series)
+        self._show_layout(self.merge)
+
+    @Slot()
+    def next_candidate(self):
+        '''
+        Zoom to the next candidate neither rejected nor labeled yet,
+        wrapping around
+        '''
+        if self.labels is None:
+            return
+        num = len(self.candidates)
+        first = 0 if self.candidate is None else self.candidate + 1
+        self.candidate = None
+        for i in range(num):
+            ind = (first + i) % num
+            if not self.labels.reviewed(*self.candidates[ind]):
+                self.candidate = ind
+                break
+        if self.candidate is None:
+            self.ui.info_label.setText('| No candidates left' if num else '| No candidates, see candidates.py')
+            self._update_overlay()
+            return
+        start, end = self.candidates[self.candidate]
+        last = len(self.xs) - 1
+        # show the candidate with some context on both sides
+        pad = max(end - start, 50) * 2
+        self.kpi_plt.set_xlim(self.xs[max(start - pad, 0)], self.xs[min(end + pad, last)])
+        self.ui.info_label.setText('| Candidate %d of %d: %d — %d' % (self.candidate + 1, num, start, end))
+        self.canvas.draw_idle()
+        self._update_overlay()
+
+    @Slot()
+    def accept_candidate(self):
+        '''
+        Label the candidate under review as a segment and go to the next one
+        '''
+        if self.labels is None or self.candidate is None:
+            return
+        self._record(self.machine_list[self.ind], 'add_segment', *self.candidates[self.candidate])
+        self._update_labels()
+        self.next_candidate()
+
+    @Slot()
+    def reject_candidate(self):
+        if self.labels is None or self.candidate is None:
+            return
+        self._record(self.machine_list[self.ind], 'reject', *self.candidates[self.candidate])
+        self._update_labels()
+        self.next_candidate()
 
     @Slot()
     def finish(self):
-        self.lr = -1
-        self.lr_list = []
-        self.x_list = []
-        self.segments = 0
-        self.anomaly_length = 0
+        if self.labels is None:
+            # still loading, the machine was never shown
+            return
         machine = self.machine_list[self.ind % len(self.machine_list)]
-        path = self.config['label_dir']+'/label_process_'+self.dir_+'.txt'
-        with open(path, 'a') as f:
-            f.writelines('machine\n')
-        self.ind = (self.ind+1) % len(self.machine_list)
+        self.journal.compact(journal_path(self.config, self.dir_, machine), snapshot(self.labels))
+        self._save_progress(machine, DONE)
+        self.ind = self._next_unfinished(self.ind+1)
         machine = self.machine_list[self.ind]
-        self.data = self._read_data(machine)
-        self.merge_kpi, self.merge_str = self.kpi_2be_merged(self.data)
-        self.ui.merge_label.setText('Merge KPIs')
-        self.ui.mergeKPIs_button.setText(self.merge_str+'To\n'+str(self.merge_kpi[-1]))
-        self.ui.merge_button.setText('Merge')
-        self.merge = False
-        self.draw(self.data, self.merge)
-        self.ui.segment_button.setText('0')
-        self.ui.percent_button.setText('0.0%')
+        self._start_load(machine)
 
     '''
     def _zoom_score(self, event):
@@ -0,0 +1,48 @@
+import os
+import time
+import sqlite3
+
+SCHEMA = '''
+create table if not exists progress (
+    dir text, machine text, status text, segments integer, anomaly_length integer,
+    started real, updated real, finished real, primary key (dir, machine));
+'''
+
+STARTED = 'started'
+DONE = 'done'
+
+
+class ProgressStore:
+    '''
+    Labeling status of every machine, kept in <label_dir>/label_progress.db
+    '''
+
+    def __init__(self, label_dir):
+        self.db = sqlite3.connect(os.path.join(label_dir, 'label_progress.db'))
+        # the rollback journal, the label dir may be on a network file system
+        # without wal support. The store is written when a machine is started,
+        # left or finished, not on every label click.
+        self.db.execute('pragma journal_mode=delete')
+        self.db.executescript(SCHEMA)
+
+    def statuses(self, dir_):
+        '''
+        Get {machine: status} of the machines of dir_ labeled so far
+        '''
+        return dict(self.db.execute('select machine, status from progress where dir = ?', (dir_,)))
+
+    def update(self, dir_, machine, status, segments=None, anomaly_length=None):
+        '''
+        Set the status of machine, counts left as None keep their stored value
+        '''
+        now = time.time()
+        self.db.execute('insert or ignore into progress (dir, machine, started) values (?, ?, ?)',
+                        (dir_, machine, now))
+        self.db.execute('update progress set status = ?, segments = coalesce(?, segments), '
+                        'anomaly_length = coalesce(?, anomaly_length), updated = ?, '
+                        'finished = case when ? then ? else finished end where dir = ? and machine = ?',
+                        (status, segments, anomaly_length, now, status == DONE, now, dir_, machine))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
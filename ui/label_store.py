@@ -0,0 +1,211 @@
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+
+class IntervalSet:
+    '''
+    Sorted, coalescing set of closed integer intervals [start, end]
+    '''
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.length = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __contains__(self, i):
+        return self.find(i) is not None
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def find(self, i):
+        '''
+        Get the interval covering index i, None if i is not covered
+        '''
+        j = bisect_right(self.starts, i) - 1
+        if j >= 0 and self.ends[j] >= i:
+            return self.starts[j], self.ends[j]
+        return None
+
+    def add(self, start, end=None):
+        end = start if end is None else end
+        # intervals overlapping or adjacent to [start, end] are merged
+        i = bisect_left(self.ends, start - 1)
+        j = bisect_right(self.starts, end + 1)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j-1])
+            self.length -= sum(e - s + 1 for s, e in zip(self.starts[i:j], self.ends[i:j]))
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+        self.length += end - start + 1
+
+    def remove(self, start, end=None):
+        end = start if end is None else end
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i >= j:
+            return
+        starts, ends = [], []
+        if self.starts[i] < start:
+            starts.append(self.starts[i])
+            ends.append(start - 1)
+        if self.ends[j-1] > end:
+            starts.append(end + 1)
+            ends.append(self.ends[j-1])
+        self.length -= sum(e - s + 1 for s, e in zip(self.starts[i:j], self.ends[i:j]))
+        self.length += sum(e - s + 1 for s, e in zip(starts, ends))
+        self.starts[i:j] = starts
+        self.ends[i:j] = ends
+
+    def mask(self, n):
+        '''
+        Dense 0/1 array of length n, 1 where an index is covered
+        '''
+        starts = np.clip(np.array(self.starts, dtype=np.int64), 0, n)
+        ends = np.clip(np.array(self.ends, dtype=np.int64) + 1, 0, n)
+        delta = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(delta, starts, 1)
+        np.add.at(delta, ends, -1)
+        return (np.cumsum(delta[:n]) > 0).astype(np.uint8)
+
+
+class LabelStore:
+    '''
+    Labels of one machine: single anomaly points (middle button) and
+    left/right segments (right button), each undone in click order.
+    Overlapping labels are counted once in the anomaly length. Scored
+    candidates are accepted as segments or kept as rejected.
+    '''
+
+    def __init__(self, length):
+        self.length = length
+        self.points = []
+        self.segments = []
+        self.pending = None
+        self.covered = IntervalSet()
+        # (start, end) candidates rejected by the labeler
+        self.rejected = []
+        # every label as a (start, end) pair sorted by start
+        self.labels = []
+
+    @property
+    def anomaly_length(self):
+        return self.covered.length
+
+    @property
+    def percent(self):
+        return self.covered.length / self.length * 100 if self.length else 0.0
+
+    def is_anomaly(self, i):
+        return i in self.covered
+
+    def mask(self):
+        return self.covered.mask(self.length)
+
+    def marks(self):
+        '''
+        Indexes of every mark to draw, including an unfinished left bound
+        '''
+        marks = self.points + [x for segment in self.segments for x in segment]
+        if self.pending is not None:
+            marks.append(self.pending)
+        return marks
+
+    def click_ops(self, button, x, dblclick=False):
+        '''
+        Get the (op, args) operations a click at index x means: the middle
+        button adds a point and a double click undoes it with the point of
+        its first press, the right button adds a bound and a double click
+        undoes the last segment with the bound opened by its first press
+        '''
+        if button == 2:
+            if not dblclick:
+                return [('add_point', [x])]
+            if len(self.points) > 1:
+                return [('undo_point', []), ('undo_point', [])]
+        elif button == 3:
+            if not dblclick:
+                return [('add_bound', [x])]
+            if self.pending is not None and self.segments:
+                return [('cancel_pending', []), ('undo_segment', [])]
+        return []
+
+    def add_point(self, x):
+        self.points.append(x)
+        self._add(x, x)
+
+    def undo_point(self):
+        if not self.points:
+            return False
+        x = self.points.pop()
+        self._remove(x, x)
+        return True
+
+    def add_bound(self, x):
+        '''
+        Alternately open and close a segment, return True when one is closed
+        '''
+        if self.pending is None:
+            self.pending = x
+            return False
+        left, self.pending = self.pending, None
+        self.segments.append((left, x))
+        self._add(min(left, x), max(left, x))
+        return True
+
+    def add_segment(self, left, right):
+        '''
+        Add a whole segment, an unfinished left bound is kept open
+        '''
+        self.segments.append((left, right))
+        self._add(min(left, right), max(left, right))
+
+    def reject(self, start, end):
+        self.rejected.append((start, end))
+
+    def reviewed(self, start, end):
+        '''
+        Whether candidate [start, end] was rejected or is already labeled
+        '''
+        if (start, end) in self.rejected:
+            return True
+        covered = self.covered.find(start)
+        return covered is not None and covered[1] >= end
+
+    def cancel_pending(self):
+        self.pending = None
+
+    def undo_segment(self):
+        if not self.segments:
+            return False
+        left, right = self.segments.pop()
+        self._remove(min(left, right), max(left, right))
+        return True
+
+    def _clip(self, start, end):
+        return max(start, 0), min(end, self.length - 1)
+
+    def _add(self, start, end):
+        start, end = self._clip(start, end)
+        insort(self.labels, (start, end))
+        if start <= end:
+            self.covered.add(start, end)
+
+    def _remove(self, start, end):
+        start, end = self._clip(start, end)
+        del self.labels[bisect_left(self.labels, (start, end))]
+        if start > end:
+            return
+        # drop the covered component and re-add the labels inside it
+        component = self.covered.find(start)
+        self.covered.remove(*component)
+        i = bisect_left(self.labels, (component[0],))
+        j = bisect_right(self.labels, (component[1], float('inf')))
+        for label in self.labels[i:j]:
+            if label[0] <= label[1]:
+                self.covered.add(*label)
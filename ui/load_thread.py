@@ -0,0 +1,59 @@
+import time
+import threading
+
+from PySide2.QtCore import QThread, Signal
+
+from loader import LoadCancelled
+from instrument import span
+
+
+def coarse(data, rows):
+    '''
+    Keep every k-th row of the arrays in data so at most rows remain
+    '''
+    step = max(len(data['value']) // rows, 1)
+    return {key: (item[::step] if key in ['timestamp', 'value', 'tag'] and item is not None else item)
+            for key, item in data.items()}
+
+
+class LoadThread(QThread):
+    '''
+    Load one machine off the GUI thread. While a file is parsed, progress
+    and a coarse preview of the rows read so far are emitted, the full
+    data follows with loaded, together with the labels read_labels(machine,
+    data) rebuilt on this thread. Setting cancel stops a stale load.
+    '''
+    progress = Signal(float)
+    preview = Signal(object)
+    loaded = Signal(object, object)
+    failed = Signal(str)
+
+    def __init__(self, loader, machine, read_labels, preview_rows=20000, preview_interval=1.0):
+        QThread.__init__(self)
+        self.loader = loader
+        self.machine = machine
+        self.read_labels = read_labels
+        self.preview_rows = preview_rows
+        self.preview_interval = preview_interval
+        self.cancel = threading.Event()
+        self.last_preview = time.time()
+
+    def run(self):
+        try:
+            # a machine prefetched in time is a cache hit
+            with span('load', machine=self.machine):
+                data = self.loader.get(self.machine, self._progress, self.cancel)
+            labels = self.read_labels(self.machine, data)
+        except LoadCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if not self.cancel.is_set():
+            self.loaded.emit(data, labels)
+
+    def _progress(self, fraction, partial):
+        self.progress.emit(fraction)
+        if time.time() - self.last_preview >= self.preview_interval and len(partial['value']) > 1:
+            self.last_preview = time.time()
+            self.preview.emit(coarse(partial, self.preview_rows))
@@ -0,0 +1,181 @@
+import os
+import threading
+import pandas as pd
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from colcache import load_sidecar, write_sidecar
+from instrument import span
+from kpi_profile import load_profile
+from pyramid import load_pyramid
+from readers import READERS, LoadCancelled
+
+
+def data_path(config, dir_, machine):
+    return config['data_root'] + '/'+dir_+'/'+machine+'.'+config['file']
+
+
+def parse_file(config, path, project=True, progress=None, cancel=None):
+    '''
+    Parse a source file into a {'timestamp', 'value', 'tag'} dict
+    '''
+    if config['file'] not in READERS:
+        raise SystemError('File type "'+config['file']+'" is not supported!')
+    with span('parse', file=path, bytes=os.path.getsize(path)) as s:
+        dict_ = READERS[config['file']](config, path, project, progress, cancel)
+        s.set(rows=len(dict_['value']))
+    return dict_
+
+
+def read_data(config, dir_, machine, progress=None, cancel=None):
+    path = data_path(config, dir_, machine)
+    if not os.path.exists(path):
+        raise SystemError('File in \"'+path+'\" does not exist!')
+    dict_ = None
+    if config['mmap_cache']:
+        dict_ = load_sidecar(path)
+        if dict_ is None:
+            # the sidecar keeps every column so it serves any noshow_kpi
+            parsed = parse_file(config, path, False, progress, cancel)
+            try:
+                with span('write_sidecar', file=path):
+                    write_sidecar(path, parsed)
+                dict_ = load_sidecar(path) or parsed
+            except OSError:
+                # e.g. a read-only data root, fall back to parsing every visit
+                dict_ = parsed
+    if dict_ is None:
+        dict_ = parse_file(config, path, True, progress, cancel)
+
+    # pkl and npz files may hold float64 or object arrays, the view reads float32
+    for key in ['value', 'tag']:
+        if dict_.get(key) is not None and dict_[key].dtype != np.float32:
+            dict_[key] = np.asarray(dict_[key], dtype=np.float32)
+    kpi = kpi_columns(dict_)
+    with span('pyramid', file=path):
+        dict_['pyramid'] = load_pyramid(path, dict_, kpi, config['pyramid_rows'])
+    if config['tag'] is False:
+        dict_['tag'] = None
+    if config['date'] is False:
+        dict_['timestamp'] = None
+    else:
+        # held once as int64 seconds, the x-positions of every draw
+        dict_['timestamp'] = np.asarray(dict_['timestamp'], dtype=np.int64)
+    with span('profile', file=path):
+        dict_['profile'] = load_profile(path, dict_['value'], kpi)
+    return dict_
+
+
+def kpi_columns(dict_):
+    '''
+    Get the original indexes of the kpis stored in the columns of
+    dict_['value'], the csv reader already drops the kpis in noshow_kpi
+    '''
+    if dict_.get('kpi') is not None:
+        return [int(kpi) for kpi in dict_['kpi']]
+    return list(range(dict_['value'].shape[1]))
+
+
+def data_nbytes(dict_):
+    '''
+    Get the resident size of the arrays in a machine dict, memory-mapped
+    arrays are paged in by the OS and are not counted
+    '''
+    nbytes = 0
+    for item in dict_.values():
+        if isinstance(item, np.memmap):
+            continue
+        elif isinstance(item, (pd.Series, pd.DataFrame)):
+            nbytes += int(np.sum(item.memory_usage(index=True)))
+        elif isinstance(item, np.ndarray):
+            nbytes += item.nbytes
+    return nbytes
+
+
+class MachineLoader:
+    '''
+    LRU cache of parsed machine dicts bounded by total bytes, filled
+    ahead of time by a background thread. It is bounded by count as well,
+    a machine read from the cache keeps its memory maps, and a file handle
+    per map, open while it is cached.
+    '''
+
+    def __init__(self, config, dir_, max_bytes=1 << 30, max_entries=8, workers=1):
+        self.config = config
+        self.dir_ = dir_
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def get(self, machine, progress=None, cancel=None):
+        '''
+        Get the dict of machine, from the cache or a load already running,
+        else loaded on this thread. Every load is registered in pending, so
+        a machine is never loaded twice at once.
+        '''
+        while True:
+            with self.lock:
+                if machine in self.cache:
+                    self.cache.move_to_end(machine)
+                    return self.cache[machine][0]
+                future = self.pending.get(machine)
+                if future is None:
+                    future = Future()
+                    # running, so close() doesn't cancel it
+                    future.set_running_or_notify_cancel()
+                    self.pending[machine] = future
+                    break
+            try:
+                return future.result()
+            except LoadCancelled:
+                # cancelled by the caller that started it, unless it is us
+                if cancel is not None and cancel.is_set():
+                    raise
+        try:
+            dict_ = self._load(machine, progress, cancel)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(dict_)
+        return dict_
+
+    def prefetch(self, machines):
+        with self.lock:
+            for machine in machines:
+                if machine in self.cache or machine in self.pending:
+                    continue
+                self.pending[machine] = self.executor.submit(self._load, machine)
+
+    def close(self):
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _load(self, machine, progress=None, cancel=None):
+        try:
+            dict_ = read_data(self.config, self.dir_, machine, progress, cancel)
+            self._put(machine, dict_)
+        finally:
+            # cached before it leaves pending, a get in between doesn't load it again
+            with self.lock:
+                self.pending.pop(machine, None)
+        return dict_
+
+    def _put(self, machine, dict_):
+        nbytes = data_nbytes(dict_)
+        with self.lock:
+            # a machine larger than the whole budget is never cached
+            if nbytes > self.max_bytes or machine in self.cache:
+                return
+            self.cache[machine] = (dict_, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes or len(self.cache) > self.max_entries:
+                _, (_, evicted) = self.cache.popitem(last=False)
+                self.nbytes -= evicted
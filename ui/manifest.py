@@ -0,0 +1,140 @@
+'''
+Index of the machines under a data root, kept in <data_root>/.manifest.db.
+
+Every directory is stored with its mtime and only rescanned when it
+changed, so opening a large or remote data root reads the index instead of
+listing every directory again. A file rewritten in place, or a sidecar
+written later, doesn't change the mtime of the directory, so the files of
+the directory chosen for labeling are checked by size and mtime again.
+'''
+import os
+import json
+import sqlite3
+
+from colcache import sidecar_dir
+
+SCHEMA = '''
+create table if not exists dirs (name text primary key, mtime integer);
+create table if not exists machines (
+    dir text, machine text, path text, type text, size integer, mtime integer,
+    rows integer, kpis integer, primary key (dir, machine, type));
+'''
+
+
+def split_name(filename):
+    '''
+    Split a file name into machine and file type at the last dot
+    '''
+    machine, ext = os.path.splitext(filename)
+    return machine, ext[1:]
+
+
+def _shape(path, size, mtime):
+    '''
+    Rows and kpi number recorded in the sidecar header of path, if it is fresh
+    '''
+    try:
+        with open(os.path.join(sidecar_dir(path), 'header.json')) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if header.get('mtime') != mtime or header.get('size') != size or 'shape' not in header:
+        return None, None
+    return header['shape'][0], header['shape'][1]
+
+
+class Manifest:
+
+    def __init__(self, root, path=None):
+        self.root = root
+        path = path or os.path.join(root, '.manifest.db')
+        try:
+            self.db = sqlite3.connect(path)
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            # e.g. a read-only data root, the index only lives for this run
+            self.db = sqlite3.connect(':memory:')
+            self.db.executescript(SCHEMA)
+
+    def refresh(self):
+        '''
+        Rescan the directories whose mtime changed and drop removed ones
+        '''
+        known = dict(self.db.execute('select name, mtime from dirs'))
+        found = set()
+        # a missing data root simply holds no directories
+        if os.path.isdir(self.root):
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_dir():
+                        continue
+                    found.add(entry.name)
+                    mtime = entry.stat().st_mtime_ns
+                    if known.get(entry.name) != mtime:
+                        self._scan(entry.name, entry.path, mtime)
+        for name in set(known) - found:
+            self.db.execute('delete from dirs where name = ?', (name,))
+            self.db.execute('delete from machines where dir = ?', (name,))
+        self.db.commit()
+        return self
+
+    def refresh_dir(self, dir_):
+        '''
+        Check every file of dir_ by size and mtime, e.g. once it is chosen
+        '''
+        dirpath = os.path.join(self.root, dir_)
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            return self
+        self._scan(dir_, dirpath, mtime)
+        self.db.commit()
+        return self
+
+    def _scan(self, dir_, dirpath, mtime):
+        '''
+        Update the files of a directory whose size or mtime changed, and the
+        shape of the ones whose sidecar was written since the last scan
+        '''
+        old = {row[:2]: row[2:] for row in self.db.execute(
+            'select machine, type, size, mtime, rows, kpis from machines where dir = ?', (dir_,))}
+        try:
+            sidecars = set(os.listdir(os.path.join(dirpath, '.cache')))
+        except OSError:
+            sidecars = set()
+        rows = []
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                machine, type_ = split_name(entry.name)
+                stat = entry.stat()
+                stored = old.pop((machine, type_), None)
+                if stored is not None and stored[:2] == (stat.st_size, stat.st_mtime_ns) and \
+                        (stored[2] is not None or entry.name not in sidecars):
+                    continue
+                shape = (None, None)
+                if entry.name in sidecars:
+                    shape = _shape(entry.path, stat.st_size, stat.st_mtime_ns)
+                if stored is not None and stored == (stat.st_size, stat.st_mtime_ns) + shape:
+                    continue
+                rows.append((dir_, machine, entry.path, type_, stat.st_size, stat.st_mtime_ns) + shape)
+        self.db.executemany('delete from machines where dir = ? and machine = ? and type = ?',
+                            [(dir_,) + key for key in old])
+        self.db.executemany('insert or replace into machines values (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.execute('insert or replace into dirs values (?, ?)', (dir_, mtime))
+
+    def all_machine(self):
+        '''
+        Get {dir: [machine, ...]} of every directory holding a file
+        '''
+        all_machine = {}
+        for dir_, machine in self.db.execute('select distinct dir, machine from machines order by dir, machine'):
+            all_machine.setdefault(dir_, []).append(machine)
+        return all_machine
+
+    def types(self, dir_):
+        return [row[0] for row in self.db.execute('select distinct type from machines where dir = ?', (dir_,))]
+
+    def close(self):
+        self.db.close()
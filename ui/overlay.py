@@ -0,0 +1,80 @@
+import numpy as np
+
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.transforms import blended_transform_factory
+
+from instrument import span
+
+
+def _verts(spans):
+    '''
+    Rectangles spanning the height of the axes between (left, right) pairs
+    '''
+    spans = np.asarray(spans, dtype=float).reshape(-1, 2)
+    verts = np.zeros((len(spans), 4, 2))
+    verts[:, :2, 0] = spans[:, :1]
+    verts[:, 2:, 0] = spans[:, 1:]
+    verts[:, 1:3, 1] = 1
+    return verts
+
+
+class MarkerOverlay:
+    '''
+    Label marks, segment spans and the candidate under review kept in
+    animated collections per axes. A full draw of the figure caches its
+    background, then adding or undoing a mark only restores that background
+    and blits the overlay.
+    '''
+
+    def __init__(self, canvas, axes_list, color='r', highlight='orange'):
+        self.canvas = canvas
+        self.background = None
+        self.artists = []
+        for axes in axes_list:
+            # x in data coordinates, y spanning the whole height of the axes
+            transform = blended_transform_factory(axes.transData, axes.transAxes)
+            spans = PolyCollection([], facecolors=color, edgecolors='none', alpha=0.15,
+                                   transform=transform, animated=True)
+            candidate = PolyCollection([], facecolors=highlight, edgecolors='none', alpha=0.3,
+                                       transform=transform, animated=True)
+            marks = LineCollection([], colors=color, linestyles='-', linewidths=1,
+                                   transform=transform, animated=True)
+            for artist in [spans, candidate, marks]:
+                axes.add_collection(artist, autolim=False)
+            self.artists.append((axes, spans, candidate, marks))
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def set_data(self, marks, spans, candidate=()):
+        '''
+        marks are x positions of vertical lines, spans are (left, right) pairs
+        and candidate an optional (left, right) pair drawn highlighted
+        '''
+        marks = np.asarray(marks, dtype=float).ravel()
+        segments = np.zeros((len(marks), 2, 2))
+        segments[:, :, 0] = marks[:, None]
+        segments[:, 1, 1] = 1
+        verts = _verts(spans)
+        candidate = _verts(candidate)
+        for _, spans_artist, candidate_artist, marks_artist in self.artists:
+            spans_artist.set_verts(verts)
+            candidate_artist.set_verts(candidate)
+            marks_artist.set_segments(segments)
+
+    def update(self):
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        with span('blit'):
+            self.canvas.restore_region(self.background)
+            self._draw_artists()
+            self.canvas.blit(self.canvas.figure.bbox)
+
+    def _on_draw(self, event):
+        # animated artists are skipped by a full draw, paint them on top
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for axes, *artists in self.artists:
+            for artist in artists:
+                axes.draw_artist(artist)
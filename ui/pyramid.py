@@ -0,0 +1,179 @@
+'''
+Multi-resolution min/max/mean pyramid of the series of a machine.
+
+Level f holds one bucket per f consecutive rows, for f = 2, 4, 8, ...
+The pyramid is stored next to the columnar sidecar, the levels of an array
+one after the other in a single file memory-mapped once, so an overview
+only reads the coarse levels. Build it for a whole dataset with
+
+    python pyramid.py <data_root> <dir> <file type>
+'''
+import os
+import sys
+import json
+import numpy as np
+
+from colcache import sidecar_dir, source_key
+
+# bump when the layout of the pyramid changes
+VERSION = 2
+# the coarsest level keeps at least this many buckets
+MIN_BUCKETS = 256
+
+
+def pyramid_dir(path):
+    return os.path.join(sidecar_dir(path), 'pyramid')
+
+
+def _reduce(low, high, total, count, size):
+    starts = np.arange(0, len(low), size)
+    return (np.fmin.reduceat(low, starts, axis=0), np.fmax.reduceat(high, starts, axis=0),
+            np.add.reduceat(total, starts, axis=0), np.add.reduceat(count, starts, axis=0))
+
+
+def build_levels(array):
+    '''
+    Get {factor: (min, max, mean)} of a (rows, columns) array, each level
+    reduced from the previous one
+    '''
+    array = np.asarray(array, dtype=np.float32)
+    rows = len(array)
+    levels = {}
+    valid = ~np.isnan(array)
+    low, high = array, array
+    total = np.where(valid, array, 0).astype(np.float64)
+    count = valid.astype(np.int64)
+    factor = 1
+    while rows // (factor * 2) >= MIN_BUCKETS:
+        low, high, total, count = _reduce(low, high, total, count, 2)
+        factor *= 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (total / count).astype(np.float32)
+        levels[factor] = (low, high, mean)
+    return levels
+
+
+def write_pyramid(path, arrays, kpi):
+    '''
+    Build and store the pyramid of every (rows, columns) array in arrays,
+    kpi are the original indexes of the columns of arrays['value']
+    '''
+    dirname = pyramid_dir(path)
+    os.makedirs(dirname, exist_ok=True)
+    header = source_key(path)
+    header.update({'version': VERSION, 'kpi': [int(i) for i in kpi], 'arrays': {}})
+    for name, array in arrays.items():
+        levels = build_levels(array)
+        # (min/max/mean, buckets of every level, columns), the rows of each level in the header
+        header['arrays'][name] = []
+        start = 0
+        for factor in sorted(levels):
+            stop = start + len(levels[factor][0])
+            header['arrays'][name].append([factor, start, stop])
+            start = stop
+        stacked = np.empty((3, start) + array.shape[1:], dtype=np.float32)
+        for factor, start, stop in header['arrays'][name]:
+            for i, level in enumerate(levels[factor]):
+                stacked[i, start:stop] = level
+        tmp = os.path.join(dirname, name + '.tmp.npy')
+        np.save(tmp, stacked)
+        os.replace(tmp, os.path.join(dirname, name + '.npy'))
+    header['rows'] = len(arrays['value'])
+    tmp = os.path.join(dirname, 'header.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp, os.path.join(dirname, 'header.json'))
+    # files of arrays no longer stored or of older layouts
+    for f in os.listdir(dirname):
+        if f.endswith('.npy') and f[:-4] not in arrays and not f.endswith('.tmp.npy'):
+            os.remove(os.path.join(dirname, f))
+
+
+class Pyramid:
+    '''
+    Memory-mapped levels of a stored pyramid
+    '''
+
+    def __init__(self, path):
+        dirname = pyramid_dir(path)
+        with open(os.path.join(dirname, 'header.json')) as f:
+            header = json.load(f)
+        key = source_key(path)
+        if header.get('version') != VERSION or header['mtime'] != key['mtime'] or header['size'] != key['size']:
+            raise ValueError('pyramid of "%s" is stale' % path)
+        self.rows = header['rows']
+        self.kpi = header['kpi']
+        self.index = np.arange(len(self.kpi))
+        self.levels = {}
+        for name, levels in header['arrays'].items():
+            # one mapping, and one file handle, per array
+            stacked = np.load(os.path.join(dirname, name + '.npy'), mmap_mode='r')
+            self.levels[name] = {factor: [stacked[i, start:stop] for i in range(3)]
+                                 for factor, start, stop in levels}
+
+    def select(self, kpi):
+        '''
+        Map the columns of a value matrix holding the kpis in kpi
+        '''
+        self.index = np.array([self.kpi.index(i) for i in kpi], dtype=np.int64)
+        return self
+
+    def level_for(self, name, rows, width):
+        '''
+        The coarsest factor still giving one bucket per pixel for rows
+        visible rows, None when the raw rows are needed
+        '''
+        factors = [f for f in self.levels.get(name, {}) if rows / f >= width]
+        return max(factors) if factors else None
+
+    def window(self, name, factor, lo, hi, cols):
+        '''
+        Get the bucket bounds and the min/max of cols for the rows [lo, hi)
+        '''
+        low, high, _ = self.levels[name][factor]
+        b_lo, b_hi = lo // factor, min((hi - 1) // factor + 1, len(low))
+        if name == 'value':
+            cols = self.index[cols]
+        starts = np.arange(b_lo, b_hi) * factor
+        ends = np.minimum(starts + factor, self.rows) - 1
+        return starts, ends, low[b_lo:b_hi][:, cols], high[b_lo:b_hi][:, cols]
+
+
+def load_pyramid(path, dict_, kpi, min_rows):
+    '''
+    Get the pyramid of a machine with at least min_rows rows, built and
+    stored on first use. None for short series or when it can't be stored.
+    '''
+    if dict_['value'].shape[0] < min_rows:
+        return None
+    try:
+        pyramid = Pyramid(path)
+        if set(kpi) <= set(pyramid.kpi):
+            return pyramid.select(kpi)
+    except (OSError, ValueError, KeyError):
+        pass
+    arrays = {'value': dict_['value']}
+    if dict_.get('tag') is not None:
+        arrays['tag'] = np.asarray(dict_['tag'], dtype=np.float32).reshape(-1, 1)
+    try:
+        write_pyramid(path, arrays, kpi)
+        return Pyramid(path).select(kpi)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == '__main__':
+    from loader import read_data
+    if len(sys.argv) != 4:
+        print('usage: python pyramid.py <data_root> <dir> <file type>')
+        sys.exit(1)
+    data_root, dir_, file_ = sys.argv[1:]
+    # read_data stores the sidecar, the profile and the pyramid of every machine
+    config = {'file': file_, 'data_root': data_root, 'noshow_kpi': None, 'tag': True, 'date': True,
+              'mmap_cache': True, 'chunk_bytes': 256 << 20, 'pyramid_rows': 0}
+    for f in sorted(os.listdir(os.path.join(data_root, dir_))):
+        if f.startswith('.') or not f.endswith('.' + file_):
+            continue
+        machine = f[:-len(file_)-1]
+        read_data(config, dir_, machine)
+        print(machine)
@@ -0,0 +1,219 @@
+'''
+Readers of the source files of a machine, one per file type in READERS.
+
+Every table holds a timestamp column, the kpi columns and an optional tag
+column last. A reader parses only the columns which will be shown, i.e.
+the kpis not in noshow_kpi plus timestamp and tag when they are displayed
+(all of them when project is False), as float32, and only the rows
+[start, stop). It returns a {'timestamp', 'value', 'tag'} dict, plus 'kpi'
+holding the original indexes of the columns of value when some were left
+out. progress gets the fraction read and the rows parsed so far after
+every chunk, setting the cancel event stops the parse with LoadCancelled.
+'''
+import os
+import pickle
+import pandas as pd
+import numpy as np
+
+# rows per chunk when streaming large files
+CHUNK_ROWS = 1 << 16
+# bytes of the head of a csv sampled to estimate its rows
+SAMPLE_BYTES = 1 << 20
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def _estimate_rows(path):
+    '''
+    Estimate the rows of a csv from its size and the lines of its head,
+    instead of reading the whole file
+    '''
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(SAMPLE_BYTES)
+    lines = head.count(b'\n')
+    if len(head) == size or not lines:
+        return max(lines, 1)
+    return int(size / len(head) * lines * 1.05) + 1
+
+
+def _grow(array, rows, filled):
+    grown = np.empty((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:filled] = array[:filled]
+    return grown
+
+
+def select_columns(config, columns, project=True):
+    '''
+    Get the kpi indexes, the kpi column names and whether to read timestamp
+    and tag from the column names of a table
+    '''
+    has_tag = 'tag' in columns
+    kpi_names = columns[1:len(columns)-1] if has_tag else columns[1:]
+    kpi = list(range(len(kpi_names)))
+    if project and config['noshow_kpi']:
+        kpi = [i for i in kpi if i not in config['noshow_kpi']]
+    value_cols = [kpi_names[i] for i in kpi]
+    read_ts = not project or config['date']
+    read_tag = has_tag and (not project or config['tag'])
+    return kpi, len(kpi_names), value_cols, read_ts, read_tag
+
+
+def read_chunks(chunks, rows, kpi, kpi_num, value_cols, read_ts, read_tag, progress=None, cancel=None):
+    '''
+    Copy the DataFrames of chunks into preallocated arrays, rows is an
+    estimate of their total length. The arrays grow geometrically when
+    it is exceeded.
+    '''
+    value = np.empty((rows, len(value_cols)), dtype=np.float32)
+    ts = np.empty(rows, dtype=np.int64) if read_ts else None
+    tag = np.empty(rows, dtype=np.float32) if read_tag else None
+    start = 0
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            raise LoadCancelled()
+        stop = start + len(chunk)
+        if stop > len(value):
+            rows = max(stop, 2 * len(value))
+            value = _grow(value, rows, start)
+            ts = _grow(ts, rows, start) if read_ts else None
+            tag = _grow(tag, rows, start) if read_tag else None
+        value[start:stop] = chunk[value_cols].to_numpy()
+        if read_ts:
+            ts[start:stop] = chunk['timestamp'].to_numpy()
+        if read_tag:
+            tag[start:stop] = chunk['tag'].to_numpy()
+        start = stop
+        if progress is not None:
+            partial = {'timestamp': ts[:stop] if read_ts else None, 'value': value[:stop],
+                       'tag': tag[:stop] if read_tag else None}
+            if len(kpi) != kpi_num:
+                partial['kpi'] = np.array(kpi)
+            progress(min(stop / max(rows, 1), 1.0), partial)
+    dict_ = {'timestamp': ts[:start] if read_ts else None, 'value': value[:start],
+             'tag': tag[:start] if read_tag else None}
+    if len(kpi) != kpi_num:
+        # original indexes of the columns of value
+        dict_['kpi'] = np.array(kpi)
+    return dict_
+
+
+def _dtypes(value_cols, read_tag):
+    dtype = {col: np.float32 for col in value_cols}
+    if read_tag:
+        dtype['tag'] = np.float32
+    return dtype
+
+
+def _usecols(value_cols, read_ts, read_tag):
+    return value_cols + (['timestamp'] if read_ts else []) + (['tag'] if read_tag else [])
+
+
+def _slice(start, stop, rows):
+    start = min(start or 0, rows)
+    stop = rows if stop is None else min(stop, rows)
+    return start, max(stop, start)
+
+
+def read_csv(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    '''
+    Files larger than config['chunk_bytes'], or any file read with a
+    progress callback, are streamed in chunks
+    '''
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    kpi, kpi_num, value_cols, read_ts, read_tag = select_columns(config, columns, project)
+    usecols = _usecols(value_cols, read_ts, read_tag)
+    dtype = _dtypes(value_cols, read_tag)
+    # rows before start are skipped by the parser, the header is kept
+    skiprows = range(1, start + 1) if start else None
+    nrows = None if stop is None else stop - (start or 0)
+
+    if progress is None and os.path.getsize(path) <= config['chunk_bytes']:
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, skiprows=skiprows, nrows=nrows)
+        chunks, rows = [df], len(df)
+    else:
+        rows = _estimate_rows(path) if nrows is None else nrows
+        chunks = pd.read_csv(path, usecols=usecols, dtype=dtype, skiprows=skiprows, nrows=nrows,
+                             chunksize=CHUNK_ROWS)
+    return read_chunks(chunks, rows, kpi, kpi_num, value_cols, read_ts, read_tag, progress, cancel)
+
+
+def read_parquet(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    '''
+    Only the row groups overlapping [start, stop) are read
+    '''
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(path)
+    kpi, kpi_num, value_cols, read_ts, read_tag = select_columns(config, parquet.schema_arrow.names, project)
+    usecols = _usecols(value_cols, read_ts, read_tag)
+    metadata = parquet.metadata
+    start, stop = _slice(start, stop, metadata.num_rows)
+
+    def chunks():
+        first = 0
+        for group in range(metadata.num_row_groups):
+            last = first + metadata.row_group(group).num_rows
+            if first < stop and last > start:
+                table = parquet.read_row_group(group, columns=usecols)
+                table = table.slice(max(start - first, 0), min(stop, last) - max(start, first))
+                yield table.to_pandas()
+            first = last
+    return read_chunks(chunks(), stop - start, kpi, kpi_num, value_cols, read_ts, read_tag, progress, cancel)
+
+
+def read_feather(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    '''
+    The file is memory-mapped, only the selected columns and rows are touched
+    '''
+    import pyarrow.ipc as ipc
+    import pyarrow.feather as feather
+    columns = ipc.open_file(path).schema.names
+    kpi, kpi_num, value_cols, read_ts, read_tag = select_columns(config, columns, project)
+    table = feather.read_table(path, columns=_usecols(value_cols, read_ts, read_tag), memory_map=True)
+    start, stop = _slice(start, stop, table.num_rows)
+    table = table.slice(start, stop - start)
+    chunks = (batch.to_pandas() for batch in table.to_batches(max_chunksize=CHUNK_ROWS))
+    return read_chunks(chunks, stop - start, kpi, kpi_num, value_cols, read_ts, read_tag, progress, cancel)
+
+
+def read_hdf(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    '''
+    Read the first frame of a pandas HDF5 file. Frames stored in table
+    format are read column-selectively, fixed format ones whole
+    '''
+    with pd.HDFStore(path, mode='r') as store:
+        key = store.keys()[0]
+        storer = store.get_storer(key)
+        if not storer.is_table:
+            df = store.select(key)
+            kpi, kpi_num, value_cols, read_ts, read_tag = select_columns(config, list(df.columns), project)
+            start, stop = _slice(start, stop, len(df))
+            chunks = [df.iloc[start:stop][_usecols(value_cols, read_ts, read_tag)]]
+            return read_chunks(chunks, stop - start, kpi, kpi_num, value_cols, read_ts, read_tag, progress, cancel)
+
+        columns = list(store.select(key, start=0, stop=0).columns)
+        kpi, kpi_num, value_cols, read_ts, read_tag = select_columns(config, columns, project)
+        usecols = _usecols(value_cols, read_ts, read_tag)
+        start, stop = _slice(start, stop, storer.nrows)
+        chunks = (store.select(key, columns=usecols, start=first, stop=min(first + CHUNK_ROWS, stop))
+                  for first in range(start, stop, CHUNK_ROWS))
+        return read_chunks(chunks, stop - start, kpi, kpi_num, value_cols, read_ts, read_tag, progress, cancel)
+
+
+def read_pkl(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def read_npz(config, path, project=True, progress=None, cancel=None, start=None, stop=None):
+    data = np.load(path)
+    dict_ = {}
+    for key in data.files:
+        dict_[key] = data[key]
+    return dict_
+
+
+READERS = {'csv': read_csv, 'pkl': read_pkl, 'npz': read_npz,
+           'parquet': read_parquet, 'feather': read_feather, 'h5': read_hdf, 'hdf5': read_hdf}
@@ -0,0 +1,98 @@
+import numpy as np
+import matplotlib as mpl
+
+from matplotlib.collections import LineCollection
+
+
+def kpi_layout(kpi, noshow_kpi=None, merge_kpi=None):
+    '''
+    Place the kpis of a value matrix holding the kpis in kpi, one row each
+    offset by its row number. With merge_kpi, those kpis share the last row.
+    Get the kpi labelling every row, the columns to draw and their offsets.
+    '''
+    columns = {k: i for i, k in enumerate(kpi)}
+    if noshow_kpi is None:
+        kpi_list = list(columns)
+    else:
+        kpi_list = [i for i in columns if i not in noshow_kpi]
+    if merge_kpi:
+        kpi_list = [i for i in kpi_list if i not in merge_kpi]
+
+    # plot kpis, each one offset to its own row
+    value_cols = [columns[k] for k in kpi_list]
+    offsets = list(range(len(kpi_list)))
+
+    # merge kpis into the last row
+    if merge_kpi:
+        kpi_list.append(merge_kpi[-1])
+        value_cols += [columns[k] for k in merge_kpi]
+        offsets += [len(kpi_list) - 1] * len(merge_kpi)
+    return kpi_list, np.array(value_cols, dtype=np.int64), np.array(offsets, dtype=float)
+
+
+def default_colors():
+    return mpl.rcParams['axes.prop_cycle'].by_key()['color']
+
+
+class LineRenderer:
+    '''
+    Draw every trace as its own Line2D
+    '''
+
+    def __init__(self, axes, colors=None, linewidth=1):
+        self.axes = axes
+        self.colors = colors or default_colors()
+        self.linewidth = linewidth
+        self.visible = True
+        self.lines = []
+
+    def set_data(self, xs, ys):
+        ys = ys.reshape(len(ys), -1)
+        while len(self.lines) > ys.shape[1]:
+            self.lines.pop().remove()
+        for index in range(ys.shape[1]):
+            if index < len(self.lines):
+                self.lines[index].set_data(xs, ys[:, index])
+            else:
+                color = self.colors[index % len(self.colors)]
+                self.lines.extend(self.axes.plot(xs, ys[:, index], color=color, linewidth=self.linewidth,
+                                                 visible=self.visible))
+
+    def set_visible(self, visible):
+        self.visible = visible
+        for line in self.lines:
+            line.set_visible(visible)
+
+    def remove(self):
+        for line in self.lines:
+            line.remove()
+        self.lines = []
+
+
+class CollectionRenderer:
+    '''
+    Draw all traces as one LineCollection whose segments are updated in place
+    '''
+
+    def __init__(self, axes, colors=None, linewidth=1):
+        self.axes = axes
+        self.colors = colors or default_colors()
+        self.collection = LineCollection([], linewidths=linewidth)
+        axes.add_collection(self.collection, autolim=False)
+
+    def set_data(self, xs, ys):
+        ys = ys.reshape(len(ys), -1)
+        segments = np.empty((ys.shape[1], len(xs), 2))
+        segments[:, :, 0] = xs
+        segments[:, :, 1] = ys.T
+        self.collection.set_segments(segments)
+        self.collection.set_color([self.colors[index % len(self.colors)] for index in range(ys.shape[1])])
+
+    def set_visible(self, visible):
+        self.collection.set_visible(visible)
+
+    def remove(self):
+        self.collection.remove()
+
+
+RENDERERS = {'lines': LineRenderer, 'collection': CollectionRenderer}
@@ -0,0 +1,44 @@
+'''
+Forms and images shared by the windows, each read from disk once per run.
+Every MsgBox and LabelWidget builds its form from the cached .ui bytes
+with one QUiLoader, icons and pixmaps are created once and reused.
+'''
+from functools import lru_cache
+
+from PySide2.QtGui import QPixmap, QIcon
+from PySide2.QtUiTools import QUiLoader
+from PySide2.QtCore import QBuffer, QByteArray
+
+_loader = None
+_registered = set()
+_forms = {}
+
+
+def load_ui(path, parent, custom_widgets=()):
+    '''
+    Build the form of the .ui file path as a child of parent
+    '''
+    global _loader
+    if _loader is None:
+        _loader = QUiLoader()
+    for widget in custom_widgets:
+        if widget not in _registered:
+            _loader.registerCustomWidget(widget)
+            _registered.add(widget)
+    if path not in _forms:
+        with open(path, 'rb') as f:
+            _forms[path] = QByteArray(f.read())
+    buffer = QBuffer()
+    buffer.setData(_forms[path])
+    buffer.open(QBuffer.ReadOnly)
+    return _loader.load(buffer, parent)
+
+
+@lru_cache(maxsize=None)
+def icon(path):
+    return QIcon(path)
+
+
+@lru_cache(maxsize=None)
+def pixmap(path):
+    return QPixmap(path)
@@ -0,0 +1,135 @@
+'''
+Small overview images of machines, rendered headless with Agg and stored
+as <sidecar>/thumbnail.png. Render those of a whole dataset on every core
+with
+
+    python thumbnail.py <data_root> <dir> <file type> [workers]
+
+Machines whose source did not change since their thumbnail are skipped.
+'''
+import os
+import sys
+import json
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from colcache import sidecar_dir, source_key
+from decimate import minmax_decimate
+from loader import data_path, read_data, kpi_columns
+from renderer import CollectionRenderer, kpi_layout
+
+# size of a thumbnail in inches at DPI
+SIZE = (4, 2)
+DPI = 64
+
+
+def thumbnail_path(path):
+    return os.path.join(sidecar_dir(path), 'thumbnail.png')
+
+
+def _fresh(path):
+    try:
+        with open(os.path.join(sidecar_dir(path), 'thumbnail.json')) as f:
+            return json.load(f) == source_key(path) and os.path.exists(thumbnail_path(path))
+    except (OSError, ValueError):
+        return False
+
+
+def _overview(data, name, array, cols, offsets, width):
+    '''
+    The min/max envelope of the columns cols of array, from the pyramid
+    when it has a level of at least width buckets
+    '''
+    rows = len(array)
+    xs = np.arange(rows)
+    pyramid = data.get('pyramid')
+    factor = pyramid.level_for(name, rows, width) if pyramid is not None else None
+    if factor is None:
+        ys = np.asarray(array)[:, cols].astype(np.float32) + offsets
+        return minmax_decimate(xs, ys, 0, rows - 1, width)
+    starts, ends, low, high = pyramid.window(name, factor, 0, rows, cols)
+    xs = np.stack([starts, ends], axis=1).ravel()
+    ys = np.stack([low, high], axis=1).reshape(-1, len(cols)) + offsets
+    return xs, ys
+
+
+def render_thumbnail(config, dir_, machine, force=False):
+    '''
+    Render the thumbnail of machine, return False when it was up to date
+    '''
+    path = data_path(config, dir_, machine)
+    if not force and _fresh(path):
+        return False
+    data = read_data(config, dir_, machine)
+    kpi_list, value_cols, offsets = kpi_layout(kpi_columns(data), config['noshow_kpi'])
+
+    # the kpi rows of the label page, the tag below them
+    figure = Figure(figsize=SIZE, dpi=DPI, facecolor='white')
+    canvas = FigureCanvasAgg(figure)
+    tag = data.get('tag')
+    rows = len(kpi_list) + (3 if tag is not None else 0)
+    grid = figure.add_gridspec(rows, 1, left=0, bottom=0, right=1, top=1, hspace=0)
+    kpi_plt = figure.add_subplot(grid[:len(kpi_list), 0])
+    width = int(SIZE[0] * DPI)
+    CollectionRenderer(kpi_plt, linewidth=0.5).set_data(
+        *_overview(data, 'value', data['value'], value_cols, offsets, width))
+    kpi_plt.set_ylim(-1, len(kpi_list))
+    axes = [kpi_plt]
+    if tag is not None:
+        tag_plt = figure.add_subplot(grid[len(kpi_list):, 0], sharex=kpi_plt)
+        tag = np.asarray(tag).reshape(-1, 1)
+        CollectionRenderer(tag_plt, colors=['blue'], linewidth=0.5).set_data(
+            *_overview(data, 'tag', tag, np.zeros(1, dtype=np.int64), np.zeros(1), width))
+        low, high = np.nanmin(tag), np.nanmax(tag)
+        margin = (high - low) * 0.05 or 0.05
+        tag_plt.set_ylim(low - margin, high + margin)
+        axes.append(tag_plt)
+    for ax in axes:
+        ax.set_xlim(0, max(len(data['value']) - 1, 1))
+        ax.set_axis_off()
+
+    os.makedirs(sidecar_dir(path), exist_ok=True)
+    tmp = thumbnail_path(path) + '.tmp.png'
+    canvas.print_png(tmp)
+    os.replace(tmp, thumbnail_path(path))
+    with open(os.path.join(sidecar_dir(path), 'thumbnail.json'), 'w') as f:
+        json.dump(source_key(path), f)
+    return True
+
+
+def _render(args):
+    config, dir_, machine = args
+    try:
+        return machine, render_thumbnail(config, dir_, machine), None
+    except Exception as e:
+        return machine, False, str(e)
+
+
+def render_all(config, dir_, machines, workers=None):
+    '''
+    Render the thumbnails of machines on a pool of processes, yield
+    (machine, rendered, error) as they finish
+    '''
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_render, [(config, dir_, machine) for machine in machines], chunksize=4):
+            yield result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [4, 5]:
+        print('usage: python thumbnail.py <data_root> <dir> <file type> [workers]')
+        sys.exit(1)
+    data_root, dir_, file_ = sys.argv[1:4]
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    config = {'file': file_, 'data_root': data_root, 'noshow_kpi': None, 'tag': True, 'date': False,
+              'mmap_cache': True, 'chunk_bytes': 256 << 20, 'pyramid_rows': 1 << 18}
+    machines = sorted(f[:-len(file_)-1] for f in os.listdir(os.path.join(data_root, dir_))
+                      if not f.startswith('.') and f.endswith('.' + file_))
+    for machine, rendered, error in render_all(config, dir_, machines, workers):
+        if error:
+            print(machine, 'failed:', error)
+        else:
+            print(machine, 'rendered' if rendered else 'up to date')
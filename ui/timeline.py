@@ -0,0 +1,70 @@
+import time
+from functools import lru_cache
+
+import numpy as np
+import matplotlib.ticker as ticker
+
+# a step longer than GAP_FACTOR times the median step is drawn as a break
+GAP_FACTOR = 5
+
+
+def positions(data, date):
+    '''
+    The x-position of every row, the int64 timestamps in date mode else
+    the row indexes
+    '''
+    if date:
+        return np.asarray(data['timestamp'], dtype=np.int64)
+    return np.arange(data['value'].shape[0])
+
+
+def find_gaps(xs):
+    '''
+    Get the rows i where the step from xs[i] to xs[i+1] is a gap
+    '''
+    if len(xs) < 3:
+        return np.zeros(0, dtype=np.int64)
+    steps = np.diff(xs)
+    return np.flatnonzero(steps > GAP_FACTOR * np.median(steps))
+
+
+def index_at(xs, x):
+    '''
+    Map an x-position to a row, the first row at or after x
+    '''
+    return int(min(np.searchsorted(xs, x, side='left'), len(xs) - 1))
+
+
+def add_breaks(xs, ys, row_xs, gaps):
+    '''
+    Insert a nan point into the drawn points xs, ys at every gap of the
+    rows, so the line is broken instead of bridging the missing samples
+    '''
+    if not len(gaps) or not len(xs):
+        return xs, ys
+    left, right = row_xs[gaps], row_xs[gaps + 1]
+    # only the gaps between two drawn points
+    shown = (left >= xs[0]) & (right <= xs[-1])
+    left, right = left[shown], right[shown]
+    at = np.searchsorted(xs, right, side='left')
+    keep = xs[at - 1] <= left
+    if not keep.any():
+        return xs, ys
+    at = at[keep]
+    xs = np.insert(xs.astype(float), at, (left[keep] + right[keep]) / 2)
+    ys = np.insert(ys, at, np.nan, axis=0)
+    return xs, ys
+
+
+@lru_cache(maxsize=1024)
+def _format_time(x):
+    return time.strftime('%Y/%m/%d %H:%M:%S', time.localtime(x))
+
+
+class TimeFormatter(ticker.Formatter):
+    '''
+    Format timestamp ticks as local dates, remembered across redraws
+    '''
+
+    def __call__(self, x, pos=None):
+        return _format_time(int(x))